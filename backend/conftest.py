@@ -0,0 +1 @@
+# Puts backend/ on sys.path so tests import modules the way main.py does
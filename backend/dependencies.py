@@ -1,5 +1,10 @@
 from flask import g, abort
+from flask_login import current_user
 
 def get_current_user():
     # Replace this with real authentication later (JWT, session, etc.)
     return {"id": "Faculty123", "username": "Faculty"}
+
+def is_faculty_or_admin():
+    """Whether the logged-in (flask_login) user may run index maintenance."""
+    return current_user.is_authenticated and getattr(current_user, "role", None) in ("faculty", "admin")
@@ -0,0 +1,103 @@
+"""Face-processing service for the web workers.
+
+Loads face_recognition/dlib once, keeps a warm process pool and serves
+detect/encode calls over a local socket, so gunicorn workers stay light and
+face capacity scales separately (FACE_POOL_WORKERS processes per service).
+
+    cd backend
+    FACE_WORKER_ADDRESS=/tmp/edu_app_face.sock FACE_WORKER_AUTHKEY=<random secret> python face_worker.py
+
+Start the web app with the same FACE_WORKER_ADDRESS and FACE_WORKER_AUTHKEY.
+Both refuse to start without an explicit FACE_WORKER_AUTHKEY.
+Matching stays in the web process against the shared gallery.
+"""
+import os
+import threading
+import traceback
+from multiprocessing.connection import Listener, AuthenticationError
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils import face_utils
+from utils.face_client import FACE_WORKER_ADDRESS, require_authkey, worker_address
+
+# The service is the only pool on the host, so it gets every core by default
+POOL_WORKERS = int(os.getenv("FACE_POOL_WORKERS", "0")) or os.cpu_count() or 1
+
+# Single-image calls run on the warm pool; batches fan out over it themselves
+POOLED = {
+    "detect_and_encode": face_utils.detect_and_encode,
+    "encode_largest_face": face_utils.encode_largest_face,
+}
+
+
+BATCHED = {
+    "detect_and_encode_many": face_utils.detect_and_encode_many,
+    "encode_largest_face_many": face_utils.encode_largest_face_many,
+}
+
+
+def call(op, args, kwargs):
+    if op in BATCHED:
+        return BATCHED[op](*args, **kwargs)
+    if op == "ping":
+        return {"pid": os.getpid(), "pool_workers": POOL_WORKERS}
+    if op not in POOLED:
+        raise ValueError(f"Unknown face worker operation: {op}")
+    return face_utils.get_face_pool().submit(POOLED[op], *args, **kwargs).result()
+
+
+def serve_connection(conn):
+    with conn:
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                reply = ("ok", call(op, args, kwargs))
+            except Exception as e:
+                traceback.print_exc()
+                reply = ("error", e)
+
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+            except Exception:
+                # The exception itself would not pickle; send its message instead
+                conn.send(("error", RuntimeError(str(reply[1]))))
+
+
+def main():
+    if not FACE_WORKER_ADDRESS:
+        raise SystemExit("Set FACE_WORKER_ADDRESS to a socket path or host:port")
+    try:
+        authkey = require_authkey()
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+    address = worker_address()
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)  # stale socket from a previous run
+
+    # Starts every pool process, each loading the models in its initializer
+    face_utils.get_face_pool(POOL_WORKERS).submit(face_utils.warm_up).result()
+    print(f"Face worker pool ready: {POOL_WORKERS} processes")
+
+    with Listener(address, authkey=authkey) as listener:
+        print(f"Face worker listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"Rejected face worker connection: {e}")
+                continue
+            threading.Thread(target=serve_connection, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ from routes.auth.face_login import router as face_login_router
 from difflib import SequenceMatcher
 from flask_login import LoginManager
 from routes.auth.user import DummyUser
+from utils.jobs import attendance_jobs
+from routes.quizassign.submission import grading_queue
+import multiprocessing
 import os
 from routes.profile.profile import router as profile_router
 
@@ -54,5 +57,16 @@ def root():
 def load_user(user_id):
     return DummyUser(user_id)
 
+def start_background_workers():
+    # Fails attendance jobs left behind by a restart
+    attendance_jobs.start()
+    # Resumes grading left pending by a previous run
+    grading_queue.start()
+
+# Face pool children are spawned and re-import this module; only server
+# processes (python main.py, or forked gunicorn workers) run background work
+if multiprocessing.parent_process() is None:
+    start_background_workers()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000)
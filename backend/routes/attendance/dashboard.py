@@ -1,9 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from extensions import mongo
 from dependencies import get_current_user
+from utils.attendance_summary import query_counts
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 from pymongo import MongoClient
+import base64
+import csv
+import io
+import json
 import os
 import traceback
 
@@ -12,12 +17,46 @@ db = client["edu_app"]
 
 dashboard_router = Blueprint("dashboard", __name__, url_prefix="/api")
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_EXPORT_FIELDS = [
+    "_id", "Student_name", "Student_regno", "course", "coursecode", "faculty",
+    "faculty_id", "date", "period", "user", "timestamp"
+]
+
+# Keyset pagination walks (timestamp, _id) newest first, optionally within one filter
+try:
+    db.attendance.create_index([("timestamp", -1), ("_id", -1)])
+    for field in ("Student_name", "coursecode", "faculty"):
+        db.attendance.create_index([(field, 1), ("timestamp", -1), ("_id", -1)])
+except Exception as e:
+    print(f"Could not ensure attendance history indexes: {e}")
+
 @dashboard_router.route("/attendance_dashboard", methods=["GET"])
 def dashboard():
     try:
         current_user = get_current_user()
-        pipeline = [{"$group": {"_id": "$Student_name", "count": {"$sum": 1}}}]
-        data = list(db.attendance.aggregate(pipeline))
+
+        group_by = request.args.get("group_by", "student")
+        if group_by not in ("student", "course", "day"):
+            return jsonify({"detail": "group_by must be student, course or day"}), 400
+
+        # Dates are YYYY-MM-DD strings, matching the attendance session key
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        for value in (date_from, date_to):
+            if value:
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    return jsonify({"detail": "from/to must be YYYY-MM-DD"}), 400
+
+        data = query_counts(
+            group_by=group_by,
+            coursecode=request.args.get("coursecode"),
+            date_from=date_from,
+            date_to=date_to
+        )
         return jsonify(data)
     except Exception as e:
         return jsonify({"detail": str(e)}), 500
@@ -26,17 +65,109 @@ def dashboard():
 def history():
     try:
         current_user = get_current_user()
-        recs = list(db.attendance.find().sort("timestamp", -1))
 
-        for i, r in enumerate(recs):
-            r["_id"] = str(r["_id"])
-            if isinstance(r.get("timestamp"), datetime):
-                r["timestamp"] = r["timestamp"].isoformat()
-        
-        return jsonify(recs)
+        try:
+            query = history_filter(request.args)
+        except ValueError as e:
+            return jsonify({"detail": str(e)}), 400
+
+        export_format = request.args.get("format", "json")
+        if export_format in ("ndjson", "csv"):
+            return stream_history(query, export_format)
+        if export_format != "json":
+            return jsonify({"detail": "format must be json, ndjson or csv"}), 400
+
+        limit = request.args.get("limit", HISTORY_PAGE_SIZE, type=int) or HISTORY_PAGE_SIZE
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        cursor = request.args.get("cursor")
+        if cursor:
+            try:
+                ts, last_id = decode_history_cursor(cursor)
+            except Exception:
+                return jsonify({"detail": "Invalid cursor"}), 400
+            query = {"$and": [query, {"$or": [
+                {"timestamp": {"$lt": ts}},
+                {"timestamp": ts, "_id": {"$lt": last_id}}
+            ]}]}
+
+        # Fetch one extra row to know whether another page exists
+        recs = list(db.attendance.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1))
+        next_cursor = None
+        if len(recs) > limit:
+            recs = recs[:limit]
+            next_cursor = encode_history_cursor(recs[-1])
+
+        return jsonify({
+            "items": [serialize_history_row(r) for r in recs],
+            "next_cursor": next_cursor
+        })
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"detail": f"Internal server error: {str(e)}"}), 500
 
+
+def parse_day(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+
+def history_filter(args):
+    query = {}
+    if args.get("student"):
+        query["Student_name"] = args["student"]
+    if args.get("coursecode"):
+        query["coursecode"] = args["coursecode"]
+    if args.get("faculty"):
+        query["faculty"] = args["faculty"]
+    if args.get("from") or args.get("to"):
+        query["timestamp"] = {}
+        if args.get("from"):
+            query["timestamp"]["$gte"] = parse_day(args["from"], "from")
+        if args.get("to"):
+            query["timestamp"]["$lt"] = parse_day(args["to"], "to") + timedelta(days=1)
+    return query
+
+def encode_history_cursor(row):
+    raw = f"{row['timestamp'].isoformat()}|{row['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor):
+    ts, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(ts), ObjectId(last_id)
+
+def serialize_history_row(r):
+    r["_id"] = str(r["_id"])
+    if isinstance(r.get("timestamp"), datetime):
+        r["timestamp"] = r["timestamp"].isoformat()
+    return r
+
+def stream_history(query, export_format):
+    """Write rows as the cursor yields them instead of buffering the whole result."""
+    cursor = db.attendance.find(query).sort([("timestamp", -1), ("_id", -1)]).batch_size(1000)
+
+    def generate_ndjson():
+        for r in cursor:
+            yield json.dumps(serialize_history_row(r), default=str) + "\n"
+
+    def generate_csv():
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=HISTORY_EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for r in cursor:
+            writer.writerow(serialize_history_row(r))
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+        yield buf.getvalue()
+
+    if export_format == "csv":
+        return Response(
+            stream_with_context(generate_csv()),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=attendance_history.csv"}
+        )
+    return Response(stream_with_context(generate_ndjson()), mimetype="application/x-ndjson")
+
 router = dashboard_router
@@ -1,17 +1,29 @@
-import base64
-import json
 import traceback
+import zipfile
 from flask import Blueprint, request, jsonify
 from extensions import mongo
-import face_recognition
-from io import BytesIO
-from dependencies import get_current_user  # Authentication dependency
+from dependencies import get_current_user, is_faculty_or_admin  # Authentication dependency
+from utils.face_index import known_face_index
+from utils.face_encoding import encoding_to_binary
+from utils.blob_store import known_face_store
+from utils.enrollment import (ArchiveTooLarge, ENROLL_MAX_ARCHIVE_BYTES, enroll_archive, list_labelled_archive,
+                              merge_prototypes, spool_archive)
+from utils.jobs import attendance_jobs
+from utils.face_client import encode_largest_face
+from utils.face_matching import quality_error
 from pymongo import MongoClient
+from datetime import datetime
 import os
 
 client = MongoClient(os.getenv("MONGO_URI"))
 db = client["edu_app"]
 
+# The shared gallery fingerprints known_faces by its latest updated_at
+try:
+    db.known_faces.create_index("updated_at")
+except Exception as e:
+    print(f"Could not ensure known_faces.updated_at index: {e}")
+
 router = Blueprint("known_face", __name__, url_prefix="/api")
 
 @router.route("/attendance_known-face", methods=["POST"])
@@ -26,26 +38,97 @@ def known_face():
             return jsonify({"error": "Missing name or image"}), 400
 
         image_bytes = image.read()
-        image_np = face_recognition.load_image_file(BytesIO(image_bytes))
-
-        encodings = face_recognition.face_encodings(image_np)
-        if not encodings:
-            return jsonify({"error": "No face found"}), 400
+        encoding, details = encode_largest_face(image_bytes, "enroll")
+        if encoding is None:
+            return jsonify({"error": quality_error(details) or "No face found"}), 400
 
-        encoding_str = json.dumps(encodings[0].tolist())
-        encoded_img = base64.b64encode(image_bytes).decode()
+        # Re-enrolling adds a prototype instead of replacing the face; the
+        # stored "encoding" becomes the centroid of the most recent ones
+        existing = db.known_faces.find_one({"name": name}, {"encoding": 1, "prototypes": 1})
+        centroid, prototypes = merge_prototypes(existing, [encoding])
 
         db.known_faces.update_one(
             {"name": name},
             {"$set": {
-                "encoding": encoding_str,
-                "image_base64": encoded_img
-            }},
+                "encoding": encoding_to_binary(centroid),
+                "prototypes": [encoding_to_binary(p) for p in prototypes],
+                "image_sha256": known_face_store.put(image_bytes),
+                "updated_at": datetime.utcnow()
+            }, "$unset": {"image_base64": ""}},
             upsert=True
         )
+        known_face_index.upsert(name, centroid, prototypes)
 
-        return jsonify({"success": True})
+        return jsonify({
+            "success": True,
+            "prototypes": len(prototypes),
+            "index_version": known_face_index.version
+        })
 
     except Exception:
         traceback.print_exc()
         return jsonify({"detail": "Failed to add face"}), 500
+
+
+@router.route("/attendance_known-faces/bulk", methods=["POST"])
+def known_faces_bulk():
+    try:
+        current_user = get_current_user()
+
+        if request.content_length and request.content_length > ENROLL_MAX_ARCHIVE_BYTES:
+            return jsonify({"error": "Archive is too large"}), 413
+
+        archive = request.files.get("archive")
+        if not archive:
+            return jsonify({"error": "Missing archive"}), 400
+
+        # Spooled to disk so the web worker never holds the whole archive; the job reads and deletes it
+        try:
+            archive_path = spool_archive(archive.stream)
+        except ArchiveTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                images = list_labelled_archive(zf)
+            if not images:
+                raise ValueError("No images found in archive")
+        except ArchiveTooLarge as e:
+            os.remove(archive_path)
+            return jsonify({"error": str(e)}), 413
+        except (ValueError, zipfile.BadZipFile) as e:
+            os.remove(archive_path)
+            return jsonify({"error": str(e)}), 400
+
+        dry_run = request.form.get("dry_run", "false").lower() == "true"
+        job_id = attendance_jobs.submit(
+            "known_faces_bulk", enroll_archive, archive_path, dry_run=dry_run,
+            owner=str(current_user.get("id"))
+        )
+
+        return jsonify({"job_id": job_id, "status": "queued", "images": len(images)}), 202
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"detail": str(e)}), 500
+
+
+@router.route("/attendance_known-faces/index", methods=["GET"])
+def known_face_index_stats():
+    try:
+        if not is_faculty_or_admin():
+            return jsonify({"detail": "Faculty or admin login required"}), 403
+        return jsonify(known_face_index.stats())
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"detail": str(e)}), 500
+
+@router.route("/attendance_known-faces/index/reload", methods=["POST"])
+def reload_known_face_index():
+    try:
+        if not is_faculty_or_admin():
+            return jsonify({"detail": "Faculty or admin login required"}), 403
+        known_face_index.reload()
+        return jsonify(known_face_index.stats())
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"detail": str(e)}), 500
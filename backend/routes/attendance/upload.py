@@ -1,14 +1,23 @@
-import base64
+import threading
+import time
 import traceback
-from flask import Blueprint, request, jsonify
-from PIL import Image
+import zipfile
+from collections import OrderedDict
+from flask import Blueprint, request, jsonify, send_file
 from io import BytesIO
 from datetime import datetime
 from bson import ObjectId
 from extensions import mongo
-from utils.face_utils import load_known_faces_from_db, recognize_faces_from_bytes
-from dependencies import get_current_user
-from pymongo import MongoClient
+from utils.face_client import recognize_faces_from_bytes, detect_and_encode_many
+from utils.face_matching import match_encodings, elapsed_ms
+from utils.image_preprocess import IMAGE_EXTENSIONS
+from utils.face_index import known_face_index
+from utils.jobs import attendance_jobs
+from utils.blob_store import photo_store, describe_image
+from utils.attendance_summary import record_attendance_counts
+from dependencies import get_current_user, is_faculty_or_admin
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 
 client = MongoClient(os.getenv("MONGO_URI"))
@@ -16,6 +25,283 @@ db = client["edu_app"]
 
 upload_router = Blueprint("upload", __name__, url_prefix="/api")
 
+MAX_BATCH_IMAGES = int(os.getenv("ATTENDANCE_MAX_BATCH_IMAGES", "20"))
+MAX_ARCHIVE_BYTES = int(os.getenv("ATTENDANCE_MAX_ARCHIVE_BYTES", str(200 * 1024 * 1024)))
+DEFAULT_PERIOD = "Morning"
+
+# One attendance row per student per class session. Legacy rows without a
+# date are left out of the index rather than failing its creation.
+ATTENDANCE_SESSION_KEY = ["Student_name", "coursecode", "date", "period"]
+try:
+    db.attendance.create_index(
+        [(field, 1) for field in ATTENDANCE_SESSION_KEY],
+        name="attendance_session",
+        unique=True,
+        partialFilterExpression={"date": {"$type": "string"}}
+    )
+except Exception as e:
+    print(f"Could not ensure attendance session index: {e}")
+
+# Course rosters partition the gallery; they change rarely, so cache them briefly
+ROSTER_CACHE_SECONDS = int(os.getenv("ROSTER_CACHE_SECONDS", "300"))
+ROSTER_CACHE_SIZE = int(os.getenv("ROSTER_CACHE_SIZE", "256"))
+# coursecode -> (expires_at, names), least recently used first
+_roster_cache = OrderedDict()
+_roster_lock = threading.Lock()
+try:
+    db.Students.create_index("coursecode")
+except Exception as e:
+    print(f"Could not ensure Students.coursecode index: {e}")
+
+def load_course_roster(coursecode):
+    with _roster_lock:
+        cached = _roster_cache.get(coursecode)
+        if cached and cached[0] > time.monotonic():
+            _roster_cache.move_to_end(coursecode)
+            return cached[1]
+
+    names = [s["name"] for s in db.Students.find({"coursecode": coursecode}, {"name": 1}) if s.get("name")]
+    with _roster_lock:
+        _roster_cache[coursecode] = (time.monotonic() + ROSTER_CACHE_SECONDS, names)
+        _roster_cache.move_to_end(coursecode)
+        while len(_roster_cache) > ROSTER_CACHE_SIZE:
+            _roster_cache.popitem(last=False)
+    return names
+
+def gallery_snapshot(coursecode=None):
+    """Gallery snapshot plus the rows of the course roster, if a course was given."""
+    if not coursecode:
+        return known_face_index.snapshot(), None
+
+    roster = load_course_roster(coursecode)
+    return known_face_index.partition_snapshot(roster)
+
+def record_attendance(present, current_user, period=DEFAULT_PERIOD, coursecode=None):
+    """Write attendance for every recognised student in three round trips total.
+
+    Rows are upserted on the session key, so recognising a student again in
+    the same session is a no-op. Returns (last student's data, names that were
+    newly recorded); raises if any row failed to write for another reason.
+    """
+    if not present:
+        return None, []
+
+    # 1) one $in query for everyone's metadata
+    students = {s["name"]: s for s in db.Students.find({"name": {"$in": present}})}
+
+    # 2) one bulk upsert for students we have never seen
+    missing = [name for name in present if name not in students]
+    if missing:
+        try:
+            db.Students.bulk_write([
+                UpdateOne({"name": name}, {"$setOnInsert": {"name": name}}, upsert=True)
+                for name in missing
+            ], ordered=False)
+        except Exception:
+            traceback.print_exc()
+        for name in missing:
+            students[name] = {"name": name}
+
+    # 3) one unordered bulk upsert for all attendance rows
+    now = datetime.utcnow()
+    date = now.strftime("%Y-%m-%d")
+    rows, ops = [], []
+    for name in present:
+        Student_data = students[name]
+        row = {
+            "Student_name": name,
+            "user": current_user.get("username", str(current_user.get("id"))),
+            "col_id": Student_data.get("col_id", "UNKNOWN"),
+            "program": Student_data.get("program", "UNKNOWN"),
+            "programcode": Student_data.get("programcode", "UNKNOWN"),
+            "course": Student_data.get("course", "UNKNOWN"),
+            "coursecode": coursecode or Student_data.get("coursecode", "UNKNOWN"),
+            "faculty": Student_data.get("faculty", "UNKNOWN"),
+            "faculty_id": Student_data.get("faculty_id", "UNKNOWN"),
+            "year": now.year,
+            "date": date,
+            "period": period,
+            "Student_regno": Student_data.get("Student_regno", "UNKNOWN"),
+            "attendance": 1,
+            "timestamp": now
+        }
+        rows.append(row)
+        key = {field: row[field] for field in ATTENDANCE_SESSION_KEY}
+        ops.append(UpdateOne(key, {"$setOnInsert": row}, upsert=True))
+
+    upserted, failed = {}, []
+    try:
+        result = db.attendance.bulk_write(ops, ordered=False)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        # A concurrent upload may win the race for a session key; that is the same no-op
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+        failed = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+
+    recorded = [rows[i] for i in sorted(upserted)]
+    try:
+        record_attendance_counts(recorded)
+    except Exception:
+        traceback.print_exc()
+
+    # Rows that were written stay; uploading again records the rest, since writes are idempotent
+    if failed:
+        names = ", ".join(rows[err["index"]]["Student_name"] for err in failed)
+        raise RuntimeError(f"Failed to record attendance for {len(failed)} of {len(rows)} students "
+                           f"({names}): {failed[0].get('errmsg')}")
+
+    return students[present[-1]], [row["Student_name"] for row in recorded]
+
+def save_uploaded_photo(image_bytes, current_user, Student_data, present, unknown, total):
+    # The original goes to the blob store once; the document keeps a hash and a thumbnail
+    try:
+        summary = describe_image(image_bytes)
+    except Exception as e:
+        print(f"Could not read uploaded photo: {e}")
+        summary = {"width": None, "height": None, "content_type": None, "thumbnail_base64": None}
+    image_sha256 = photo_store.put(image_bytes, content_type=summary["content_type"])
+
+    db.uploaded_photos.insert_one({
+        "col_id": Student_data.get("col_id", "UNKNOWN") if Student_data else "UNKNOWN",
+        "uploaded_by": str(current_user.get("id")),
+        "timestamp": datetime.utcnow(),
+        "image_sha256": image_sha256,
+        "size_bytes": len(image_bytes),
+        "width": summary["width"],
+        "height": summary["height"],
+        "thumbnail_base64": summary["thumbnail_base64"],
+        "present_Students": present,
+        "unknown_faces": unknown,
+        "total_faces": total
+    })
+
+def process_attendance_upload(report, image_bytes, current_user, threshold=None, period=DEFAULT_PERIOD,
+                              coursecode=None, roster_fallback=True):
+    report("recognizing", 10)
+    gallery, partition = gallery_snapshot(coursecode)
+
+    present, unknown, total, timings, rejected, matches = recognize_faces_from_bytes(
+        image_bytes, gallery, threshold=threshold,
+        partition=partition, fallback=roster_fallback
+    )
+
+    report("recording", 70)
+    start = time.perf_counter()
+    Student_data, recorded = record_attendance(present, current_user, period=period, coursecode=coursecode)
+    timings["record_ms"] = elapsed_ms(start)
+
+    report("saving_photo", 90)
+    save_uploaded_photo(image_bytes, current_user, Student_data, present, unknown, total)
+
+    return {
+        "present": present,
+        "unknown": unknown,
+        "total": total,
+        "low_quality": sum(rejected.values()),
+        "low_quality_reasons": rejected,
+        "recorded": len(recorded),
+        "already_recorded": len(present) - len(recorded),
+        "roster_size": len(partition) if partition is not None else None,
+        "matches": matches,
+        "index_version": gallery.version,
+        "timings": timings
+    }
+
+def read_batch_images(files, archive):
+    """Collect (filename, bytes) pairs from uploaded files and an optional zip archive."""
+    images = [(f.filename, f.read()) for f in files]
+
+    if archive:
+        with zipfile.ZipFile(BytesIO(archive.read())) as zf:
+            unpacked = 0
+            for info in zf.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                unpacked += info.file_size
+                if unpacked > MAX_ARCHIVE_BYTES:
+                    raise ValueError("Archive is too large")
+                images.append((name, zf.read(info)))
+
+    if len(images) > MAX_BATCH_IMAGES:
+        raise ValueError(f"At most {MAX_BATCH_IMAGES} images per batch")
+    return images
+
+def process_attendance_batch(report, images, current_user, threshold=None, period=DEFAULT_PERIOD,
+                             coursecode=None, roster_fallback=True):
+    report("recognizing", 10)
+    gallery, partition = gallery_snapshot(coursecode)
+
+    # Detection/encoding is the expensive part; fan it out across processes
+    analysed = detect_and_encode_many([image_bytes for _, image_bytes in images])
+
+    report("matching", 60)
+    present, photos = set(), []
+    timings = {"detect_ms": 0.0, "encode_ms": 0.0, "match_ms": 0.0}
+    rejected, matches = {}, {}
+    for (filename, _), (face_encs, _, photo_timings, photo_rejected, error) in zip(images, analysed):
+        # One-to-one within a photo; the same student may appear in several photos
+        photo_present, match_timings, photo_matches = match_encodings(
+            face_encs, gallery, threshold, partition=partition, fallback=roster_fallback
+        )
+        photo_timings.update(match_timings)
+        for key, value in photo_timings.items():
+            timings[key] = round(timings.get(key, 0.0) + value, 2)
+
+        for reason, count in photo_rejected.items():
+            rejected[reason] = rejected.get(reason, 0) + count
+        for source, count in photo_matches.items():
+            matches[source] = matches.get(source, 0) + count
+
+        present.update(photo_present)
+        photos.append({
+            "filename": filename,
+            "present": photo_present,
+            "unknown": len(face_encs) - len(photo_present),
+            "total": len(face_encs),
+            "low_quality": sum(photo_rejected.values()),
+            "error": error
+        })
+
+    report("recording", 75)
+    present = sorted(present)
+    start = time.perf_counter()
+    Student_data, recorded = record_attendance(present, current_user, period=period, coursecode=coursecode)
+    timings["record_ms"] = elapsed_ms(start)
+
+    report("saving_photo", 90)
+    for (_, image_bytes), photo in zip(images, photos):
+        save_uploaded_photo(image_bytes, current_user, Student_data, photo["present"], photo["unknown"], photo["total"])
+
+    return {
+        "present": present,
+        "unknown": sum(p["unknown"] for p in photos),
+        "total": sum(p["total"] for p in photos),
+        "low_quality": sum(rejected.values()),
+        "low_quality_reasons": rejected,
+        "recorded": len(recorded),
+        "already_recorded": len(present) - len(recorded),
+        "roster_size": len(partition) if partition is not None else None,
+        "matches": matches,
+        "photos": photos,
+        "index_version": gallery.version,
+        "timings": timings
+    }
+
+def upload_options(form):
+    """Recognition/recording options shared by the single and batch uploads."""
+    threshold = form.get("threshold", type=float)
+    if threshold is not None and not 0 < threshold <= 1:
+        raise ValueError("threshold must be between 0 and 1")
+    return {
+        "threshold": threshold,
+        "period": form.get("period") or DEFAULT_PERIOD,
+        "coursecode": form.get("coursecode") or None,
+        "roster_fallback": form.get("roster_fallback", "true").lower() != "false",
+    }
+
 @upload_router.route("/attendance_upload", methods=["POST"])
 def upload():
     try:
@@ -27,58 +313,49 @@ def upload():
         file = request.files['image']
         image_bytes = file.read()
 
-        known_encs, known_names = load_known_faces_from_db()
+        try:
+            options = upload_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        present, unknown, total = recognize_faces_from_bytes(
-            image_bytes, known_encs, known_names
+        job_id = attendance_jobs.submit(
+            "attendance_upload", process_attendance_upload,
+            image_bytes, current_user, owner=str(current_user.get("id")), **options
         )
 
-        Student_data = None
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
 
-        for name in present:
-            try:
-                db.Students.update_one({"name": name}, {"$setOnInsert": {"name": name}}, upsert=True)
-                Student_data = db.Students.find_one({"name": name})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({
+            "error": "Upload failed",
+            "details": str(e)
+        }), 500
 
-                if not Student_data:
-                    continue
+@upload_router.route("/attendance_upload_batch", methods=["POST"])
+def upload_batch():
+    try:
+        current_user = get_current_user()
 
-                db.attendance.insert_one({
-                    "Student_name": name,
-                    "user": current_user.get("username", str(current_user.get("id"))),
-                    "col_id": Student_data.get("col_id", "UNKNOWN"),
-                    "program": Student_data.get("program", "UNKNOWN"),
-                    "programcode": Student_data.get("programcode", "UNKNOWN"),
-                    "course": Student_data.get("course", "UNKNOWN"),
-                    "coursecode": Student_data.get("coursecode", "UNKNOWN"),
-                    "faculty": Student_data.get("faculty", "UNKNOWN"),
-                    "faculty_id": Student_data.get("faculty_id", "UNKNOWN"),
-                    "year": datetime.utcnow().year,
-                    "period": "Morning",
-                    "Student_regno": Student_data.get("Student_regno", "UNKNOWN"),
-                    "attendance": 1,
-                    "timestamp": datetime.utcnow()
-                })
-            except Exception as Student_exc:
-                traceback.print_exc()
-
-        image_base64 = base64.b64encode(image_bytes).decode()
-
-        db.uploaded_photos.insert_one({
-            "col_id": Student_data.get("col_id", "UNKNOWN") if Student_data else "UNKNOWN",
-            "uploaded_by": str(current_user.get("id")),
-            "timestamp": datetime.utcnow(),
-            "image_base64": image_base64,
-            "present_Students": present,
-            "unknown_faces": unknown,
-            "total_faces": total
-        })
+        try:
+            images = read_batch_images(request.files.getlist("images"), request.files.get("archive"))
+        except (ValueError, zipfile.BadZipFile) as e:
+            return jsonify({"error": str(e)}), 400
 
-        return jsonify({
-            "present": present,
-            "unknown": unknown,
-            "total": total
-        })
+        if not images:
+            return jsonify({"error": "No images provided"}), 400
+
+        try:
+            options = upload_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        job_id = attendance_jobs.submit(
+            "attendance_upload_batch", process_attendance_batch,
+            images, current_user, owner=str(current_user.get("id")), **options
+        )
+
+        return jsonify({"job_id": job_id, "status": "queued", "images": len(images)}), 202
 
     except Exception as e:
         traceback.print_exc()
@@ -87,4 +364,30 @@ def upload():
             "details": str(e)
         }), 500
 
-router = upload_router
+@upload_router.route("/attendance_photos/<image_sha256>", methods=["GET"])
+def attendance_photo(image_sha256):
+    try:
+        data, content_type = photo_store.get(image_sha256)
+        if data is None:
+            return jsonify({"error": "Photo not found"}), 404
+        return send_file(BytesIO(data), mimetype=content_type or "application/octet-stream")
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"detail": str(e)}), 500
+
+@upload_router.route("/attendance_jobs/<job_id>", methods=["GET"])
+def attendance_job(job_id):
+    try:
+        current_user = get_current_user()
+        job = attendance_jobs.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        # Results name the recognised students; only the uploader and faculty/admins may read them
+        if job.get("owner") != str(current_user.get("id")) and not is_faculty_or_admin():
+            return jsonify({"error": "Not allowed to view this job"}), 403
+        return jsonify(job)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"detail": str(e)}), 500
+
+router = upload_router
\ No newline at end of file
@@ -5,16 +5,15 @@ from werkzeug.utils import secure_filename
 from routes.auth.user import DummyUser
 from datetime import datetime  
 import os
-import face_recognition
-import numpy as np
 import re
-from PIL import Image
 from pymongo import MongoClient
 import os
-from cv2 import cvtColor, COLOR_BGR2RGB
-import cv2
-from PIL import Image
 import io
+from PIL import UnidentifiedImageError
+from utils.face_encoding import encoding_to_binary
+from utils.face_client import encode_largest_face
+from utils.face_matching import quality_error
+from utils.image_preprocess import FaceImageError
 
 client = MongoClient(os.getenv("MONGO_URI"))
 db = client["edu_app"]
@@ -42,20 +41,16 @@ def register():
         return jsonify({'error': 'User already exists'}), 400
 
     try:
-        # Read image using OpenCV to ensure proper format
-        file_bytes = np.frombuffer(image_file.read(), np.uint8)
-        image_bgr = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
-        if image_bgr is None:
+        # Decoded at reduced scale for detection (see utils/image_preprocess.py)
+        try:
+            encoding, details = encode_largest_face(image_file.read(), "register")
+        except (UnidentifiedImageError, FaceImageError):
             return jsonify({'error': 'Invalid image format'}), 400
 
-        img_array = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(img_array)
-
-        if len(encodings) == 0:
-            return jsonify({'error': 'No face detected in the image'}), 400
+        if encoding is None:
+            return jsonify({'error': quality_error(details) or 'No face detected in the image'}), 400
 
-        face_encoding = encodings[0].tolist()
+        face_encoding = encoding_to_binary(encoding)
     except Exception as e:
         return jsonify({'error': 'Image processing failed', 'details': str(e)}), 500
 
@@ -66,7 +61,8 @@ def register():
         'email': email,
         'password': hashed_password,
         'role': role,
-        'facedata': face_encoding
+        'facedata': face_encoding,
+        'face_updated_at': datetime.utcnow()
     })
 
     return jsonify({'message': 'User registered successfully'}), 201
@@ -1,14 +1,17 @@
 import os
-import json
 import io
 from flask import Blueprint, request, jsonify
 from flask_login import login_user, UserMixin
-import face_recognition
 import numpy as np
-from PIL import Image
 from pymongo import MongoClient
 import logging
 from flask_jwt_extended import create_access_token
+from bson import ObjectId
+from utils.face_index import face_login_index, FACE_LOGIN_THRESHOLD
+from utils.face_encoding import decode_encoding
+from utils.face_client import encode_largest_face
+from utils.face_matching import quality_error
+from dependencies import is_faculty_or_admin
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -18,12 +21,60 @@ logger = logging.getLogger(__name__)
 client = MongoClient(os.getenv("MONGO_URI"))
 db = client["edu_app"]
 
+# Hinted logins look users up by email; the login index catches up by face_updated_at
+try:
+    db.users.create_index("email")
+    db.users.create_index("face_updated_at")
+except Exception as e:
+    logger.warning(f"Could not ensure users indexes: {e}")
+
 router = Blueprint("face_login", __name__, url_prefix="/api")
 
+USER_FIELDS = {'email': 1, 'name': 1, 'role': 1}
+
+# Closest matches tried in turn, so a user deleted since the index loaded does not block the next one
+FACE_LOGIN_CANDIDATES = int(os.getenv("FACE_LOGIN_CANDIDATES", "3"))
+
 class DummyUser(UserMixin):
     def __init__(self, user_id):
         self.id = str(user_id)
 
+def verify_hinted_user(unknown_encoding, email=None, user_id=None):
+    """1:1 check against the one user named by the email or user_id hint."""
+    if user_id:
+        try:
+            query = {'_id': ObjectId(user_id)}
+        except Exception:
+            return None, None
+    else:
+        query = {'email': email}
+
+    user = db.users.find_one(query, dict(USER_FIELDS, facedata=1))
+    if not user or not user.get('facedata'):
+        return None, None
+
+    try:
+        known_encoding = decode_encoding(user['facedata'])
+    except Exception as e:
+        logger.warning(f"Unreadable facedata for user {user['_id']}: {e}")
+        return None, None
+
+    distance = float(np.linalg.norm(known_encoding - unknown_encoding))
+    if distance > FACE_LOGIN_THRESHOLD:
+        return None, distance
+    return user, distance
+
+def identify_user(unknown_encoding):
+    """1:N search for the closest enrolled user."""
+    for user_id, distance in face_login_index.search(unknown_encoding, k=FACE_LOGIN_CANDIDATES):
+        if distance > FACE_LOGIN_THRESHOLD:
+            break
+        user = db.users.find_one({'_id': ObjectId(user_id)}, USER_FIELDS)
+        if user:
+            return user, distance
+        face_login_index.discard(user_id)
+    return None, None
+
 @router.route("/face-login", methods=["POST"])
 def face_login():
     image_file = request.files.get('image')
@@ -32,53 +83,47 @@ def face_login():
         return jsonify({'error': 'No image provided'}), 400
 
     try:
-        img = Image.open(image_file.stream).convert("RGB")  
-        img_array = np.array(img)
-
-        unknown_encodings = face_recognition.face_encodings(img_array)
+        unknown_encoding, details = encode_largest_face(image_file.read(), "login")
 
-        if not unknown_encodings:
-            return jsonify({'error': 'No face found in image'}), 400
+        if unknown_encoding is None:
+            return jsonify({'error': quality_error(details) or 'No face found in image'}), 400
 
-        unknown_encoding = unknown_encodings[0]
+        email = request.form.get('email')
+        user_id = request.form.get('user_id')
 
-        users = list(db.users.find())  
+        if email or user_id:
+            user, distance = verify_hinted_user(unknown_encoding, email=email, user_id=user_id)
+        else:
+            user, distance = identify_user(unknown_encoding)
 
-        for user in users:
-            encoding_data = user.get('facedata')
-            if not encoding_data:
-                continue
+        if not user:
+            return jsonify({'error': 'Face not recognized'}), 401
 
-            try:
-                # Load from JSON string or list
-                if isinstance(encoding_data, str):
-                    known_encoding = np.array(json.loads(encoding_data))
-                else:
-                    known_encoding = np.array(encoding_data)
-            except Exception as e:
-                continue
-
-            if known_encoding is None or known_encoding.size == 0:
-                continue
-
-            matches = face_recognition.compare_faces([known_encoding], unknown_encoding)
-
-            if matches[0]:
-                user_obj = DummyUser(user['_id'])
-                login_user(user_obj)
-                return jsonify({
-                    'message': 'Login successful',
-                    'email': user['email'],
-                    'name': user['name'],
-                    "role": user["role"],
-                    'token': str(user['_id']),
-                    'id': str(user['_id'])
-                }), 200
-
-        return jsonify({'error': 'Face not recognized'}), 401
+        user_obj = DummyUser(user['_id'])
+        login_user(user_obj)
+        return jsonify({
+            'message': 'Login successful',
+            'email': user['email'],
+            'name': user['name'],
+            "role": user["role"],
+            'token': str(user['_id']),
+            'id': str(user['_id']),
+            'distance': round(distance, 4)
+        }), 200
 
     except Exception as e:
         return jsonify({
             'error': 'Image processing failed',
             'details': str(e)
         }), 500
+
+
+@router.route("/face-login/index", methods=["GET"])
+def face_login_index_stats():
+    try:
+        if not is_faculty_or_admin():
+            return jsonify({'error': 'Faculty or admin login required'}), 403
+        return jsonify(face_login_index.stats())
+    except Exception as e:
+        logger.error(f"Face login index stats failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to read index stats', 'details': str(e)}), 500
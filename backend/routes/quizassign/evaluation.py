@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.local_grader import answer_similarity
 
 router = Blueprint('evaluation', __name__)
 
@@ -17,9 +16,7 @@ def evaluate_descriptive():
         correct_answer=data['correct_answer']
     )
     
-    vectorizer = TfidfVectorizer().fit([answer_input.correct_answer, answer_input.Student_answer])
-    vecs = vectorizer.transform([answer_input.correct_answer, answer_input.Student_answer])
-    similarity = cosine_similarity(vecs[0:1], vecs[1:2])[0][0]
+    similarity = answer_similarity(answer_input.correct_answer, answer_input.Student_answer)
 
     score = round(similarity * 100)
 
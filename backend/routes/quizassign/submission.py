@@ -1,19 +1,21 @@
 from flask import Flask, request, jsonify
 from flask.blueprints import Blueprint
+from flask_login import current_user
+from dependencies import is_faculty_or_admin
 from pymongo import MongoClient
 from datetime import datetime
 import logging
 from bson import ObjectId
-from openai import OpenAI
-import re
 import os
 from dotenv import load_dotenv
+from utils.grading import grade_descriptive_answers, PENDING
+from utils.grading_queue import GradingQueue, GradingSource, GRADED, pending_answers, failed_answers
+from utils.grading_cache import grading_cache
+from utils.local_grader import tiered_metrics
 load_dotenv()
 
 router = Blueprint('submission', __name__)
 
-ai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,6 +26,28 @@ db = client["edu_app"]
 scheduled_quiz_collection = db["scheduled_quizzes"]
 quizzes_collection = db["quizzes"]
 submissions_collection = db["submissions"]
+scheduled_assignment_collection = db["scheduled_assignments"]
+assignments_collection = db["assignments"]
+assignment_submissions_collection = db["assignment_submissions"]
+
+# Descriptive answers of stored submissions are graded by this queue
+grading_queue = GradingQueue({
+    "quiz": GradingSource(submissions_collection, "quiz_id", [quizzes_collection, scheduled_quiz_collection]),
+    "assignment": GradingSource(
+        assignment_submissions_collection, "assignment_id",
+        [assignments_collection, scheduled_assignment_collection]
+    ),
+})
+
+for collection, parent_field in ((submissions_collection, "quiz_id"), (assignment_submissions_collection, "assignment_id")):
+    try:
+        collection.create_index("grading_status")
+        collection.create_index([(parent_field, 1), ("grading_status", 1)])
+    except Exception as e:
+        logger.warning(f"Could not ensure grading indexes on {collection.name}: {e}")
+
+# Descriptive answers are graded in the background unless GRADING_INLINE is set
+GRADING_INLINE = os.getenv("GRADING_INLINE", "0") not in ("0", "false", "no")
 
 class Answer:
     def __init__(self, text=None, selected_option=None, is_correct=None):
@@ -57,71 +81,81 @@ class Submission:
             "retake_reason": self.retake_reason
         }
 
-def extract_grade_from_response(response_text: str) -> bool:
-    """
-    Extracts grading decision from the GPT response.
-    Returns True if 'Correct' is found, False if 'Incorrect', otherwise defaults to False.
-    """
-    decision = response_text.strip().lower()
-    
-    # Direct one-word response
-    if decision in ["correct", "incorrect"]:
-        return decision == "correct"
-    
-    # Search for the words "correct" or "incorrect" in the response
-    match = re.search(r'\b(correct|incorrect)\b', decision)
-    if match:
-        return match.group(1) == "correct"
-    
-    # If nothing matched, consider it incorrect (fail-safe)
-    return False
-
-def grade_descriptive_answer(question_text, user_answer_text, correct_answer_text):
-    logger.info("📡 AI GRADING TRIGGERED: Grading descriptive answer via OpenAI")
-    try:
-        prompt = f"""
-You are an AI examiner evaluating a Student's answer. Your job is to decide if the Student's answer is logically and factually correct, even if it's written in a different style than the reference.
-
-🎯 Grading Rules:
-- Accept correct answers even if they are written in a different way or are shorter.
-- Accept valid paraphrasing, alternate explanations, or simpler words that still reflect the right concept.
-- Ignore spelling, grammar, or small formatting differences.
-- Do NOT compare word-for-word or expect exact phrasing.
-- Reject only if the answer is wrong, incomplete, or unrelated.
-
-Respond with only ONE word: **Correct** or **Incorrect**.
-
----
-
-Question:
-{question_text}
+def score_answers(questions, answers, answer_cls, defer=True):
+    """Score a submission's answers in place.
 
-Reference Answer:
-{correct_answer_text}
-
-Student's Answer:
-{user_answer_text}
-
-Final Grade (one word only):
-"""
-
-        response = ai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a strict but fair examiner who only responds with Correct or Incorrect."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-
-        response_text = response.choices[0].message.content.strip()
-        logger.info(f"✅ AI response received:\n{response_text}")
-
-        return extract_grade_from_response(response_text)
-
-    except Exception as e:
-        logger.error(f"❌ AI grading failed for question '{question_text}': {e}", exc_info=True)
-        return None
+    MCQs are checked inline. Descriptive answers are left with is_correct
+    None and grading "pending" for the background grader, or with
+    ``defer=False`` graded concurrently under a per-submission deadline
+    (whatever misses it or fails is left pending the same way).
+    Returns (score, number of pending answers).
+    """
+    score = 0
+    descriptive = []
+
+    # Process each question
+    for q in questions:
+        question_text = q["question"]
+        user_answer = answers.get(question_text)
+
+        if user_answer is None:
+            logger.info("User is un answered")
+            continue  # Skip unanswered questions (handled by frontend validation)
+
+        correct_answer = q.get("answer", "").strip().lower()
+        correct = False
+
+        # Handle both string and Answer object formats
+        if isinstance(user_answer, str):
+            # Simple string answer
+            user_answer_str = user_answer.strip().lower()
+            correct = (user_answer_str == correct_answer)
+
+        elif isinstance(user_answer, dict):
+            answer_obj = answer_cls(
+                text=user_answer.get("text"),
+                selected_option=user_answer.get("selected_option"),
+                is_correct=user_answer.get("is_correct")
+            )
+            if not q.get("options"):  # Descriptive question
+                if answer_obj.text:
+                    logger.info(f"🧠 Queueing AI grading for question: {question_text}")
+                    descriptive.append((question_text, answer_obj, correct_answer))
+                else:
+                    logger.info("Descriptive answer is empty, skipping AI check.")
+            else:
+                selected_option = answer_obj.selected_option.strip().lower() if answer_obj.selected_option else ""
+                correct = (selected_option == correct_answer)
+                answer_obj.is_correct = correct
+                logger.info(f"selected_option : {selected_option}, correct_answer : {correct_answer}")
+
+            answers[question_text] = answer_obj.dict()
+            if correct:
+                score += 1
+
+    if defer:
+        verdicts = [PENDING] * len(descriptive)
+    else:
+        verdicts = grade_descriptive_answers([
+            (question_text, answer_obj.text.strip(), correct_answer)
+            for question_text, answer_obj, correct_answer in descriptive
+        ])
+    pending = 0
+    for (question_text, answer_obj, _), verdict in zip(descriptive, verdicts):
+        answer = answer_obj.dict()
+        # Timed out (PENDING) or failed (None): left for the background grader to retry
+        if verdict is not True and verdict is not False:
+            answer["is_correct"] = None
+            answer["grading"] = PENDING
+            pending += 1
+        else:
+            logger.info(f"AI marked '{question_text}' as: {'Correct' if verdict else 'Incorrect'}")
+            answer["is_correct"] = verdict
+            if verdict:
+                score += 1
+        answers[question_text] = answer
+
+    return score, pending
 
 @router.route("/submit", methods=["POST"])
 def submit_quiz():
@@ -176,60 +210,8 @@ def submit_quiz():
                 "message": "You've already submitted this quiz"
             }), 400
 
-        score = 0
         total_questions = len(quiz["questions"])
-
-        # Process each question
-        for q in quiz["questions"]:
-            question_text = q["question"]
-            user_answer = submission.answers.get(question_text)
-            
-            if user_answer is None:
-                logger.info("User is un answered")
-                continue  # Skip unanswered questions (handled by frontend validation)
-            
-            correct_answer = q.get("answer", "").strip().lower()
-            correct = False
-
-            # Handle both string and Answer object formats
-            if isinstance(user_answer, str):
-                # Simple string answer
-                user_answer_str = user_answer.strip().lower()
-                correct = (user_answer_str == correct_answer)
-
-            elif isinstance(user_answer, dict):
-                answer_obj = Answer(
-                    text=user_answer.get("text"),
-                    selected_option=user_answer.get("selected_option"),
-                    is_correct=user_answer.get("is_correct")
-                )
-                if not q.get("options"):  # Descriptive question
-                    if answer_obj.text:
-                        logger.info(f"🧠 Triggering AI grading for question: {question_text}")
-                        logger.info(f"Student answer: {answer_obj.text.strip()}")
-                        logger.info(f"Expected answer: {correct_answer}")
-                        is_correct_ai = grade_descriptive_answer(
-                            question_text,
-                            answer_obj.text.strip(),
-                            correct_answer
-                        )
-                        logger.info(f"AI marked this answer as: {'Correct' if is_correct_ai else 'Incorrect'}")
-                        logging.info("AI checking your answer")
-                        answer_obj.is_correct = is_correct_ai
-                        if is_correct_ai:
-                            score += 1
-                    else:
-                        logger.info("Descriptive answer is empty, skipping AI check.")
-                else:
-                    selected_option = answer_obj.selected_option.strip().lower() if answer_obj.selected_option else ""
-                    correct = (selected_option == correct_answer)
-                    answer_obj.is_correct = correct
-                    logger.info(f"selected_option : {selected_option}, type : {type(selected_option)}")
-                    logger.info(f"correct_answer : {correct_answer}, type : {type(correct_answer)}")
-            
-                submission.answers[question_text] = answer_obj.dict()
-                if correct:
-                    score += 1
+        score, pending = score_answers(quiz["questions"], submission.answers, Answer, defer=not GRADING_INLINE)
 
         # Prepare submission data
         submission_data = {
@@ -242,19 +224,25 @@ def submit_quiz():
             "percentage": round((score / total_questions) * 100, 2) if total_questions else 0,
             "auto_submitted": submission.auto_submitted,
             "retake_reason": submission.retake_reason,
+            "grading_status": PENDING if pending else GRADED,
             "submitted_at": datetime.utcnow()
         }
 
         # Insert into database
         result = submissions_collection.insert_one(submission_data)
         logger.info(f"Submission saved with ID: {result.inserted_id}")
+        if pending:
+            grading_queue.enqueue("quiz", result.inserted_id)
 
         return jsonify({
             "success": True,
             "result": {
+                "submission_id": str(result.inserted_id),
+                "grading_status": submission_data["grading_status"],
                 "score": score,
                 "total_questions": total_questions,
                 "percentage": round((score / total_questions) * 100, 2) if total_questions else 0,
+                "pending_answers": pending,
                 "message": "Descriptive answers will be graded separately" if any(
                     not q.get("options") for q in quiz["questions"])
                 else "Quiz graded successfully"
@@ -272,10 +260,6 @@ def submit_quiz():
 #               ASSIGNMENT CODE
 # ==============================================
 
-scheduled_assignment_collection = db["scheduled_assignments"]
-assignments_collection = db["assignments"]
-assignment_submissions_collection = db["assignment_submissions"]
-
 class AssignmentAnswer:
     def __init__(self, text=None, selected_option=None, is_correct=None):
         self.text = text
@@ -361,59 +345,8 @@ def submit_assignment():
                 "message": "You've already submitted this assignment"
             }), 400
 
-        score = 0
         total_questions = len(assignment["questions"])
-
-        # Process each question
-        for q in assignment["questions"]:
-            question_text = q["question"]
-            user_answer = submission.answers.get(question_text)
-            
-            if user_answer is None:
-                logger.info("User is un answered")
-                continue  # Skip unanswered questions (handled by frontend validation)
-            
-            correct_answer = q.get("answer", "").strip().lower()
-            correct = False
-
-            # Handle both string and Answer object formats
-            if isinstance(user_answer, str):
-                # Simple string answer
-                user_answer_str = user_answer.strip().lower()
-                correct = (user_answer_str == correct_answer)
-
-            elif isinstance(user_answer, dict):
-                answer_obj = AssignmentAnswer(
-                    text=user_answer.get("text"),
-                    selected_option=user_answer.get("selected_option"),
-                    is_correct=user_answer.get("is_correct")
-                )
-                if not q.get("options"):  # Descriptive question
-                    if answer_obj.text:
-                        logger.info(f"🧠 Triggering AI grading for question: {question_text}")
-                        logger.info(f"Student answer: {answer_obj.text.strip()}")
-                        logger.info(f"Expected answer: {correct_answer}")
-                        is_correct_ai = grade_descriptive_answer(
-                            question_text,
-                            answer_obj.text.strip(),
-                            correct_answer
-                        )
-                        logger.info(f"AI marked this answer as: {'Correct' if is_correct_ai else 'Incorrect'}")
-                        answer_obj.is_correct = is_correct_ai
-                        if is_correct_ai:
-                            score += 1
-                    else:
-                        logger.info("Descriptive answer is empty, skipping AI check.")
-                else:
-                    selected_option = answer_obj.selected_option.strip().lower() if answer_obj.selected_option else ""
-                    correct = (selected_option == correct_answer)
-                    answer_obj.is_correct = correct
-                    logger.info(f"selected_option : {selected_option}, type : {type(selected_option)}")
-                    logger.info(f"correct_answer : {correct_answer}, type : {type(correct_answer)}")
-            
-                submission.answers[question_text] = answer_obj.dict()
-                if correct:
-                    score += 1
+        score, pending = score_answers(assignment["questions"], submission.answers, AssignmentAnswer, defer=not GRADING_INLINE)
 
         # Prepare submission data
         submission_data = {
@@ -426,19 +359,25 @@ def submit_assignment():
             "percentage": round((score / total_questions) * 100, 2) if total_questions else 0,
             "auto_submitted": submission.auto_submitted,
             "retake_reason": submission.retake_reason,
+            "grading_status": PENDING if pending else GRADED,
             "submitted_at": datetime.utcnow()
         }
 
         # Insert into database
         result = assignment_submissions_collection.insert_one(submission_data)
         logger.info(f"Assignment submission saved with ID: {result.inserted_id}")
+        if pending:
+            grading_queue.enqueue("assignment", result.inserted_id)
 
         return jsonify({
             "success": True,
             "result": {
+                "submission_id": str(result.inserted_id),
+                "grading_status": submission_data["grading_status"],
                 "score": score,
                 "total_questions": total_questions,
                 "percentage": round((score / total_questions) * 100, 2) if total_questions else 0,
+                "pending_answers": pending,
                 "message": "Descriptive answers will be graded separately" if any(
                     not q.get("options") for q in assignment["questions"])
                 else "Assignment graded successfully"
@@ -450,4 +389,113 @@ def submit_assignment():
         return jsonify({
             "error": "Internal server error",
             "message": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+# ==============================================
+#               GRADING STATUS
+# ==============================================
+
+GRADING_KINDS = {
+    "quiz": (submissions_collection, "quiz_id"),
+    "assignment": (assignment_submissions_collection, "assignment_id"),
+}
+
+def grading_kind():
+    kind = request.args.get("kind", "quiz")
+    if kind not in GRADING_KINDS:
+        return None, None
+    return kind, GRADING_KINDS[kind]
+
+def can_view_submission(doc):
+    """Faculty and admins see every submission, Students only their own."""
+    return is_faculty_or_admin() or str(doc.get("user_id")) == current_user.id
+
+@router.route("/grading-status/<submission_id>", methods=["GET"])
+def grading_status(submission_id):
+    try:
+        if not current_user.is_authenticated:
+            return jsonify({"error": "Login required"}), 401
+        kind, source = grading_kind()
+        if not kind:
+            return jsonify({"error": "kind must be quiz or assignment"}), 400
+        try:
+            oid = ObjectId(submission_id)
+        except Exception:
+            return jsonify({"error": "Invalid submission ID"}), 400
+
+        collection, parent_field = source
+        doc = collection.find_one({"_id": oid})
+        if not doc:
+            return jsonify({"error": "Submission not found"}), 404
+        if not can_view_submission(doc):
+            return jsonify({"error": "Not allowed to view this submission"}), 403
+        answers = doc.get("answers") if isinstance(doc.get("answers"), dict) else {}
+
+        return jsonify({
+            "submission_id": submission_id,
+            "kind": kind,
+            parent_field: doc.get(parent_field),
+            "user_id": doc.get("user_id"),
+            "grading_status": doc.get("grading_status", GRADED),
+            "score": doc.get("score", 0),
+            "total_questions": doc.get("total_questions", 0),
+            "percentage": doc.get("percentage", 0),
+            "pending_answers": len(pending_answers(answers)),
+            "failed_answers": len(failed_answers(answers)),
+            "graded_at": doc["graded_at"].isoformat() if doc.get("graded_at") else None
+        })
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@router.route("/grading-cache/stats", methods=["GET"])
+def grading_cache_stats():
+    try:
+        if not is_faculty_or_admin():
+            return jsonify({"error": "Faculty or admin login required"}), 403
+        return jsonify(grading_cache.stats())
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@router.route("/grading-metrics", methods=["GET"])
+def grading_metrics():
+    """How many answers the local grader decided, escalated, and agreed with the LLM on."""
+    try:
+        if not is_faculty_or_admin():
+            return jsonify({"error": "Faculty or admin login required"}), 403
+        return jsonify(tiered_metrics.stats())
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@router.route("/grading-status", methods=["GET"])
+def grading_status_summary():
+    """Per-status submission counts for one quiz or assignment, for faculty dashboards."""
+    try:
+        if not current_user.is_authenticated:
+            return jsonify({"error": "Login required"}), 401
+        if not is_faculty_or_admin():
+            return jsonify({"error": "Only faculty or admins can view grading status"}), 403
+        kind, source = grading_kind()
+        if not kind:
+            return jsonify({"error": "kind must be quiz or assignment"}), 400
+        collection, parent_field = source
+        parent_id = request.args.get(parent_field)
+        if not parent_id:
+            return jsonify({"error": f"{parent_field} is required"}), 400
+
+        counts = {}
+        for row in collection.aggregate([
+            {"$match": {parent_field: parent_id}},
+            {"$group": {"_id": "$grading_status", "count": {"$sum": 1}}}
+        ]):
+            # Submissions from before background grading have no status and are fully graded
+            status = row["_id"] or GRADED
+            counts[status] = counts.get(status, 0) + row["count"]
+        return jsonify({"kind": kind, parent_field: parent_id, "counts": counts, "total": sum(counts.values())})
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
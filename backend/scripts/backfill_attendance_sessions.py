@@ -0,0 +1,72 @@
+"""Give legacy attendance rows a session key and drop repeated sessions.
+
+Rows written before the session key existed have no ``date`` field and are
+outside the unique attendance_session index. This script fills ``date`` from
+``timestamp`` and keeps only the earliest row per (student, course, date,
+period), so those rows join the index and dashboard counts stop including
+re-uploads.
+
+    cd backend
+    python -m scripts.backfill_attendance_sessions [--dry-run]
+"""
+import argparse
+import os
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne, DeleteOne
+from dotenv import load_dotenv
+
+load_dotenv()
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+SESSION_KEY = ["Student_name", "coursecode", "date", "period"]
+
+
+def backfill(dry_run, batch_size=1000):
+    seen = set()
+    # Existing keyed rows win over legacy ones
+    for row in db.attendance.find({"date": {"$type": "string"}}, {field: 1 for field in SESSION_KEY}):
+        seen.add(tuple(row.get(field) for field in SESSION_KEY))
+
+    updated, deleted, ops = 0, 0, []
+    legacy = db.attendance.find({"date": {"$exists": False}}).sort("timestamp", 1)
+    for row in legacy:
+        timestamp = row.get("timestamp")
+        if not isinstance(timestamp, datetime):
+            continue
+        date = timestamp.strftime("%Y-%m-%d")
+        key = (row.get("Student_name"), row.get("coursecode", "UNKNOWN"), date, row.get("period", "Morning"))
+
+        if key in seen:
+            ops.append(DeleteOne({"_id": row["_id"]}))
+            deleted += 1
+        else:
+            seen.add(key)
+            ops.append(UpdateOne({"_id": row["_id"]}, {"$set": {
+                "coursecode": key[1],
+                "date": date,
+                "period": key[3]
+            }}))
+            updated += 1
+
+        if len(ops) >= batch_size:
+            if not dry_run:
+                db.attendance.bulk_write(ops, ordered=True)
+            ops = []
+
+    if ops and not dry_run:
+        db.attendance.bulk_write(ops, ordered=True)
+
+    print(f"attendance: keyed={updated} duplicates_removed={deleted}{' (dry run)' if dry_run else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    backfill(args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Accuracy/latency trade-off of the detection resolution cap.
+
+Runs detect_and_encode over a directory of sample photos at several
+max-side/upsample settings and compares each against a full-resolution,
+upsample=1 reference run:
+
+* recall      share of reference faces also found (box IoU >= 0.5)
+* drift       mean distance between a face's encoding and its reference encoding
+* kept        share of matched faces whose drift stays under FACE_MATCH_THRESHOLD
+* latency     mean and p95 of decode + detect + encode time per image
+
+No database is needed.
+
+    cd backend
+    python -m scripts.bench_detection path/to/photos --sizes 480 640 800 1024 1600 --upsample 0 1
+"""
+import argparse
+import os
+import statistics
+
+import numpy as np
+
+from utils.face_matching import MATCH_THRESHOLD
+from utils.face_utils import detect_and_encode
+from utils.image_preprocess import IMAGE_EXTENSIONS
+
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union else 0.0
+
+
+def run(images, max_side, upsample):
+    results, latencies = [], []
+    for image_bytes in images:
+        encs, boxes, timings, _ = detect_and_encode(image_bytes, max_side=max_side, upsample=upsample)
+        results.append((encs, boxes))
+        latencies.append(sum(timings.values()))
+    return results, latencies
+
+
+def compare(reference, candidate):
+    found, total, drifts = 0, 0, []
+    for (ref_encs, ref_boxes), (encs, boxes) in zip(reference, candidate):
+        total += len(ref_boxes)
+        for ref_enc, ref_box in zip(ref_encs, ref_boxes):
+            overlaps = [iou(ref_box, box) for box in boxes]
+            if overlaps and max(overlaps) >= 0.5:
+                found += 1
+                drifts.append(float(np.linalg.norm(ref_enc - encs[int(np.argmax(overlaps))])))
+    return found, total, drifts
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection resolution benchmark")
+    parser.add_argument("directory", help="folder of sample photos")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[480, 640, 800, 1024, 1600])
+    parser.add_argument("--upsample", type=int, nargs="+", default=[0, 1])
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    images = []
+    for name in names:
+        with open(os.path.join(args.directory, name), "rb") as fh:
+            images.append(fh.read())
+    if not images:
+        raise SystemExit("No images found")
+
+    print(f"{len(images)} images; reference = full resolution, upsample 1")
+    reference, ref_latency = run(images, 0, 1)
+    print(f"{'max_side':>8} {'up':>3} {'recall':>7} {'drift':>7} {'kept':>6} {'mean_ms':>9} {'p95_ms':>9}")
+    print(f"{'full':>8} {1:>3} {1.0:>7.3f} {0.0:>7.3f} {1.0:>6.2f} "
+          f"{statistics.mean(ref_latency):>9.1f} {percentile(ref_latency, 95):>9.1f}")
+
+    for max_side in args.sizes:
+        for upsample in args.upsample:
+            candidate, latency = run(images, max_side, upsample)
+            found, total, drifts = compare(reference, candidate)
+            recall = found / total if total else 0.0
+            drift = statistics.mean(drifts) if drifts else 0.0
+            kept = sum(d < MATCH_THRESHOLD for d in drifts) / len(drifts) if drifts else 0.0
+            print(f"{max_side:>8} {upsample:>3} {recall:>7.3f} {drift:>7.3f} {kept:>6.2f} "
+                  f"{statistics.mean(latency):>9.1f} {percentile(latency, 95):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Speed and accuracy of face recognition against galleries of increasing size.
+
+Synthetic mode (default, no dlib or database needed) draws identities as
+random 128-d points with dlib-like spreads (same person ~0.3 apart,
+different people ~0.8), loads them through KnownFaceIndex/FaceLoginIndex
+from an in-memory stand-in for the Mongo collections, and reports for each
+gallery size:
+
+* load        time to build the gallery from the collection
+* match       match_encodings latency per photo (p50/p95/p99) and photos/s per core
+* login       1:N face-login search latency (p50/p95/p99), recall@1 of the
+              index against an exact flat search on the same probes, and
+              the false-reject rate (right user not returned within
+              FACE_LOGIN_THRESHOLD) of both
+* FAR / FRR   per threshold: faces matched to the wrong person or to anyone
+              while not enrolled / enrolled faces left unmatched
+
+With --images DIR (layout as for bulk enrollment: name.jpg or label/*.jpg)
+the photos are also run through detection and encoding to report
+decode/detect/encode percentiles, and every same-label and cross-label pair
+gives verification FAR/FRR on real encodings.
+
+    cd backend
+    python -m scripts.bench_recognition --sizes 1000 10000 100000
+    python -m scripts.bench_recognition --sizes 1000 --images path/to/labelled
+"""
+import argparse
+import bisect
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.face_encoding import ENCODING_DIM, decode_encoding, encoding_to_binary
+from utils.face_index import KnownFaceIndex, FaceLoginIndex, FACE_LOGIN_THRESHOLD
+from utils.face_matching import MATCH_THRESHOLD, face_distance_matrix, match_encodings
+from utils.nn_search import FlatSearch
+
+DEFAULT_THRESHOLDS = [0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65]
+
+
+class InMemoryCollection:
+    """Just enough of a pymongo collection for the indexes to load from.
+
+    ``{"face_updated_at": {"$gte": t}}`` (FaceLoginIndex's catch-up before
+    every search) is answered by bisecting the documents sorted by that
+    field, as a Mongo index would, so login timings measure the search
+    rather than a Python scan.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self._sorted = sorted((d for d in docs if "face_updated_at" in d), key=lambda d: d["face_updated_at"])
+        self._stamps = [d["face_updated_at"] for d in self._sorted]
+
+    def find(self, query=None, projection=None):
+        query = query or {}
+        cond = query.get("face_updated_at")
+        if list(query) == ["face_updated_at"] and isinstance(cond, dict) and list(cond) == ["$gte"]:
+            return InMemoryCursor(self._sorted[bisect.bisect_left(self._stamps, cond["$gte"]):])
+        return InMemoryCursor([d for d in self.docs if _matches(d, query)])
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+
+class InMemoryCursor(list):
+    def sort(self, key, direction=1):
+        return InMemoryCursor(sorted(self, key=lambda d: d[key], reverse=direction < 0))
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        if isinstance(cond, dict) and "$exists" in cond:
+            if (field in doc) != cond["$exists"]:
+                return False
+        elif isinstance(cond, dict) and "$gte" in cond:
+            if field not in doc or not doc[field] >= cond["$gte"]:
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+def percentiles(values):
+    if not values:
+        return 0.0, 0.0, 0.0
+    return tuple(float(v) for v in np.percentile(values, [50, 95, 99]))
+
+
+def synthetic_identities(rng, n, inter):
+    # Two points with per-dimension spread s are about s * sqrt(2 * dim) apart
+    return rng.normal(0, inter / np.sqrt(2 * ENCODING_DIM), (n, ENCODING_DIM)).astype(np.float32)
+
+
+def jitter(rng, centers, intra, spread=0.0):
+    # Log-normal per-face scale gives the long tails real photos have (pose, light, blur)
+    scale = np.exp(rng.normal(0, spread, (len(centers), 1))) if spread else 1.0
+    noise = rng.normal(0, intra / np.sqrt(ENCODING_DIM), centers.shape) * scale
+    return (centers + noise).astype(np.float32)
+
+
+def build_collections(rng, centers, prototypes, intra):
+    known, users = [], []
+    # A minute apart, so the login catch-up window holds only the last few users
+    registered = datetime(2024, 1, 1)
+    for i, center in enumerate(centers):
+        protos = jitter(rng, np.repeat(center[None, :], prototypes, axis=0), intra)
+        known.append({
+            "name": f"person-{i}",
+            "encoding": encoding_to_binary(protos.mean(axis=0)),
+            "prototypes": [encoding_to_binary(p) for p in protos],
+        })
+        users.append({
+            "_id": i,
+            "facedata": encoding_to_binary(protos[0]),
+            "face_updated_at": registered + timedelta(minutes=i),
+        })
+    return InMemoryCollection(known), InMemoryCollection(users)
+
+
+def synthetic_photos(rng, centers, impostors, photos, faces, impostor_rate, intra, spread):
+    """[(face encodings, true names or None for impostors)]"""
+    result = []
+    for _ in range(photos):
+        genuine = rng.choice(len(centers), size=faces, replace=False)
+        is_impostor = rng.random(faces) < impostor_rate
+        encs, labels = [], []
+        for g, imp in zip(genuine, is_impostor):
+            if imp:
+                encs.append(impostors[rng.integers(len(impostors))])
+                labels.append(None)
+            else:
+                encs.append(centers[g])
+                labels.append(f"person-{g}")
+        result.append((jitter(rng, np.vstack(encs), intra, spread), labels))
+    return result
+
+
+def score(photos, gallery, threshold):
+    genuine = sum(1 for _, labels in photos for label in labels if label)
+    impostor = sum(1 for _, labels in photos for label in labels if not label)
+    correct, false_accepts = 0, 0
+    for encs, labels in photos:
+        present, _, _ = match_encodings(encs, gallery, threshold)
+        truth = {label for label in labels if label}
+        correct += len(truth.intersection(present))
+        false_accepts += len(set(present) - truth)
+    far = false_accepts / (genuine + impostor) if genuine + impostor else 0.0
+    frr = 1 - correct / genuine if genuine else 0.0
+    return far, frr
+
+
+def bench_synthetic(args, size, rng):
+    centers = synthetic_identities(rng, size, args.inter)
+    impostors = synthetic_identities(rng, max(100, args.photos), args.inter)
+    known_faces, users = build_collections(rng, centers, args.prototypes, args.intra)
+
+    start = time.perf_counter()
+    index = KnownFaceIndex(known_faces)
+    gallery = index.snapshot()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    photos = synthetic_photos(rng, centers, impostors, args.photos, min(args.faces, size), args.impostor_rate,
+                              args.intra, args.spread)
+    latencies = []
+    for encs, _ in photos:
+        start = time.perf_counter()
+        match_encodings(encs, gallery, MATCH_THRESHOLD)
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p95, p99 = percentiles(latencies)
+    per_core = 1000 / np.mean(latencies)
+
+    login = FaceLoginIndex(users)
+    login.reload()
+    exact = FlatSearch(np.vstack([decode_encoding(user["facedata"]) for user in users.docs]))
+    truth = rng.integers(size, size=args.photos)
+    probes = jitter(rng, centers[truth], args.intra, args.spread)
+    login_latencies = []
+    agree, rejected, exact_rejected = 0, 0, 0
+    for probe, user_id in zip(probes, truth):
+        start = time.perf_counter()
+        matches = login.search(probe)
+        login_latencies.append((time.perf_counter() - start) * 1000)
+
+        idx, dist = exact.search(probe)
+        agree += bool(matches) and matches[0][0] == str(users.docs[idx[0]]["_id"])
+        rejected += not matches or matches[0][0] != str(user_id) or matches[0][1] > FACE_LOGIN_THRESHOLD
+        exact_rejected += idx[0] != user_id or dist[0] > FACE_LOGIN_THRESHOLD
+    l50, l95, l99 = percentiles(login_latencies)
+
+    print(f"\ngallery {size}: load {load_ms:.0f} ms, {len(gallery.prototypes)} prototypes")
+    print(f"  match  p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} ms/photo "
+          f"({min(args.faces, size)} faces)  {per_core:.1f} photos/s per core")
+    print(f"  login  p50 {l50:.2f}  p95 {l95:.2f}  p99 {l99:.2f} ms ({login.stats()['kind']})  "
+          f"recall@1 {agree / len(probes):.4f}  FRR {rejected / len(probes):.4f} "
+          f"(flat {exact_rejected / len(probes):.4f})")
+    print(f"  {'threshold':>9} {'FAR':>8} {'FRR':>8}")
+    for threshold in args.thresholds:
+        far, frr = score(photos, gallery, threshold)
+        print(f"  {threshold:>9.2f} {far:>8.4f} {frr:>8.4f}")
+
+
+def bench_images(args):
+    # Imported here so synthetic runs work without dlib/cv2 installed
+    from utils.enrollment import read_labelled_directory
+    from utils.face_utils import detect_and_encode
+
+    images = read_labelled_directory(args.images)
+    if not images:
+        raise SystemExit("No images found")
+
+    stages, encs, labels = {}, [], []
+    for label, path, image_bytes in images:
+        try:
+            faces, boxes, timings, _ = detect_and_encode(image_bytes, "enroll")
+        except Exception as e:
+            print(f"⚠️ {path}: {e}")
+            continue
+        for key, value in timings.items():
+            stages.setdefault(key, []).append(value)
+        stages.setdefault("total_ms", []).append(sum(timings.values()))
+        if len(faces):
+            largest = max(range(len(boxes)), key=lambda i: (boxes[i][2] - boxes[i][0]) * (boxes[i][1] - boxes[i][3]))
+            encs.append(faces[largest])
+            labels.append(label)
+
+    print(f"\nimages: {len(images)} photos, {len(encs)} with a face, {len(set(labels))} labels")
+    for key, values in stages.items():
+        p50, p95, p99 = percentiles(values)
+        print(f"  {key:<11} p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f} ms")
+    if stages.get("total_ms"):
+        print(f"  {1000 / np.mean(stages['total_ms']):.2f} photos/s per core, "
+              f"{os.cpu_count()} cores")
+
+    if len(encs) < 2:
+        return
+    distances = face_distance_matrix(np.vstack(encs), np.vstack(encs))
+    labels = np.asarray(labels)
+    upper = np.triu_indices(len(encs), k=1)
+    same = (labels[:, None] == labels[None, :])[upper]
+    pair_distances = distances[upper]
+    print(f"  pairs: {int(same.sum())} genuine, {int((~same).sum())} impostor")
+    print(f"  {'threshold':>9} {'FAR':>8} {'FRR':>8}")
+    for threshold in args.thresholds:
+        far = float((pair_distances[~same] < threshold).mean()) if (~same).any() else 0.0
+        frr = float((pair_distances[same] >= threshold).mean()) if same.any() else 0.0
+        print(f"  {threshold:>9.2f} {far:>8.4f} {frr:>8.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="gallery sizes")
+    parser.add_argument("--photos", type=int, default=200, help="synthetic photos per gallery size")
+    parser.add_argument("--faces", type=int, default=30, help="faces per synthetic photo")
+    parser.add_argument("--impostor-rate", type=float, default=0.1, help="share of faces not enrolled")
+    parser.add_argument("--prototypes", type=int, default=3, help="prototypes per synthetic person")
+    parser.add_argument("--intra", type=float, default=0.3, help="typical same-person distance")
+    parser.add_argument("--inter", type=float, default=0.8, help="typical different-person distance")
+    parser.add_argument("--spread", type=float, default=0.35, help="log-normal spread of probe noise")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--images", help="directory of labelled photos to run through detection too")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for size in args.sizes:
+        bench_synthetic(args, size, rng)
+    if args.images:
+        bench_images(args)
+
+
+if __name__ == "__main__":
+    main()
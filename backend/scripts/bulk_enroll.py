@@ -0,0 +1,58 @@
+"""Enroll known faces in bulk from a zip archive or a directory of labelled photos.
+
+Accepted layouts (mixable): ``<name>.jpg`` for one photo per person, or
+``<regno or name>/<anything>.jpg`` for several. A folder name matching a
+student's Student_regno enrolls that student's name. Photos are encoded in
+parallel (through the face worker when FACE_WORKER_ADDRESS is set), written
+with a single bulk_write, and failures are listed at the end.
+
+    cd backend
+    python -m scripts.bulk_enroll path/to/intake.zip [--dry-run] [--report failures.json]
+"""
+import argparse
+import json
+import os
+import zipfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.enrollment import bulk_enroll, directory_reader, list_labelled_archive, list_labelled_directory
+
+
+def report_progress(stage, progress):
+    print(f"{stage}: {progress}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="zip archive or directory of labelled photos")
+    parser.add_argument("--dry-run", action="store_true", help="encode and report without writing")
+    parser.add_argument("--report", help="write the full result, including failures, to this JSON file")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        images = list_labelled_directory(args.source)
+        print(f"{len(images)} images, {len({label for label, _ in images})} labels")
+        result = bulk_enroll(report_progress, images, directory_reader(args.source), dry_run=args.dry_run)
+    else:
+        with zipfile.ZipFile(args.source) as zf:
+            images = list_labelled_archive(zf)
+            print(f"{len(images)} images, {len({label for label, _ in images})} labels")
+            result = bulk_enroll(report_progress, images, zf.read, dry_run=args.dry_run)
+
+    for failure in result["failures"]:
+        print(f"⚠️ {failure['path']} ({failure['label']}): {failure['error']}")
+    print(
+        f"known_faces: enrolled={result['enrolled']} new={result['new']} encoded={result['encoded']} "
+        f"failed={result['failed']}{' (dry run)' if args.dry_run else ''} timings={result['timings']}"
+    )
+
+    if args.report:
+        with open(args.report, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
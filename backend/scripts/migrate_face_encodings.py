@@ -0,0 +1,69 @@
+"""Rewrite stored face encodings as BSON float32 binary.
+
+Converts known_faces.encoding (JSON strings) and users.facedata (lists of
+floats) in place. Documents already in binary form are skipped, so the
+script can be re-run safely. Converted known_faces get a new updated_at so
+a published shared gallery is rebuilt.
+
+    cd backend
+    python -m scripts.migrate_face_encodings [--dry-run] [--batch-size 500]
+"""
+import argparse
+import os
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+from utils.face_encoding import decode_encoding, encoding_to_binary, is_binary_encoding
+
+load_dotenv()
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+
+def migrate_collection(collection, field, batch_size, dry_run, stamp=None):
+    converted, skipped, failed = 0, 0, 0
+    ops = []
+
+    for doc in collection.find({field: {"$exists": True}}, {field: 1}):
+        value = doc.get(field)
+        if value is None or is_binary_encoding(value):
+            skipped += 1
+            continue
+        try:
+            packed = encoding_to_binary(decode_encoding(value))
+        except Exception as e:
+            print(f"⚠️ {collection.name} {doc['_id']}: {e}")
+            failed += 1
+            continue
+
+        fields = {field: packed}
+        if stamp:
+            fields[stamp] = datetime.utcnow()
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        converted += 1
+        if len(ops) >= batch_size:
+            if not dry_run:
+                collection.bulk_write(ops, ordered=False)
+            ops = []
+
+    if ops and not dry_run:
+        collection.bulk_write(ops, ordered=False)
+
+    print(f"{collection.name}.{field}: converted={converted} skipped={skipped} failed={failed}")
+    return converted, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    migrate_collection(db.known_faces, "encoding", args.batch_size, args.dry_run, stamp="updated_at")
+    migrate_collection(db.users, "facedata", args.batch_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Move inline uploaded_photos.image_base64 payloads into the photo blob store.
+
+Each document gets image_sha256, size, dimensions and a thumbnail, and its
+image_base64 field is removed. Already-migrated documents are skipped.
+
+    cd backend
+    python -m scripts.migrate_uploaded_photos [--dry-run]
+"""
+import argparse
+import base64
+import os
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.blob_store import photo_store, describe_image
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+
+def migrate(dry_run):
+    moved, failed = 0, 0
+    for doc in db.uploaded_photos.find({"image_base64": {"$exists": True}}, {"image_base64": 1}):
+        try:
+            image_bytes = base64.b64decode(doc["image_base64"])
+            summary = describe_image(image_bytes)
+        except Exception as e:
+            print(f"⚠️ uploaded_photos {doc['_id']}: {e}")
+            failed += 1
+            continue
+
+        if not dry_run:
+            image_sha256 = photo_store.put(image_bytes, content_type=summary["content_type"])
+            db.uploaded_photos.update_one({"_id": doc["_id"]}, {
+                "$set": {
+                    "image_sha256": image_sha256,
+                    "size_bytes": len(image_bytes),
+                    "width": summary["width"],
+                    "height": summary["height"],
+                    "thumbnail_base64": summary["thumbnail_base64"]
+                },
+                "$unset": {"image_base64": ""}
+            })
+        moved += 1
+
+    print(f"uploaded_photos: moved={moved} failed={failed}{' (dry run)' if dry_run else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    migrate(args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
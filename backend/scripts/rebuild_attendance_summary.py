@@ -0,0 +1,21 @@
+"""Rebuild the pre-aggregated attendance dashboard counters from raw rows.
+
+Run once after deploying the summaries, or whenever they need a backfill.
+
+    cd backend
+    python -m scripts.rebuild_attendance_summary
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.attendance_summary import rebuild
+
+
+def main():
+    counts = rebuild()
+    print(f"attendance summaries rebuilt: {counts}")
+
+
+if __name__ == "__main__":
+    main()
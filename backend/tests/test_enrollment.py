@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+from utils import enrollment
+from utils.enrollment import ArchiveTooLarge, label_images, spool_archive
+
+
+def test_flat_archive_labels_by_filename():
+    assert label_images(["alice.jpg", "bob.png"]) == ["alice", "bob"]
+
+
+def test_single_regno_folder_is_one_person():
+    assert label_images(["R123/a.jpg", "R123/b.jpg"]) == ["R123", "R123"]
+
+
+def test_wrapper_folder_above_person_folders_is_ignored():
+    paths = ["intake/R123/a.jpg", "intake/R456/b.jpg"]
+    assert label_images(paths) == ["R123", "R456"]
+
+
+def test_windows_separators():
+    assert label_images(["intake\\R123\\a.jpg"]) == ["R123"]
+
+
+def test_spool_archive_rejects_streams_over_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(enrollment, "ENROLL_SPOOL_DIR", str(tmp_path))
+    with pytest.raises(ArchiveTooLarge):
+        spool_archive(io.BytesIO(b"x" * 2048), limit=1024)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_archive_copies_streams_within_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(enrollment, "ENROLL_SPOOL_DIR", str(tmp_path))
+    path = spool_archive(io.BytesIO(b"zip bytes"), limit=1024)
+    with open(path, "rb") as fh:
+        assert fh.read() == b"zip bytes"
@@ -0,0 +1,116 @@
+import os
+from pymongo import MongoClient, UpdateOne
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+# Counters maintained on write so the dashboard never scans raw attendance.
+student_totals = db["attendance_student_totals"]   # _id: Student_name
+course_totals = db["attendance_course_totals"]     # _id: coursecode
+daily_counts = db["attendance_daily"]              # one row per student, course and date
+
+try:
+    daily_counts.create_index([("date", 1), ("coursecode", 1)])
+    daily_counts.create_index([("coursecode", 1), ("date", 1)])
+except Exception as e:
+    print(f"Could not ensure attendance_daily indexes: {e}")
+
+
+def _daily_id(row):
+    return {"Student_name": row["Student_name"], "coursecode": row["coursecode"], "date": row["date"]}
+
+
+def record_attendance_counts(rows):
+    """Increment the summaries for newly recorded attendance rows."""
+    if not rows:
+        return
+
+    per_student, per_course, per_day = {}, {}, {}
+    for row in rows:
+        per_student[row["Student_name"]] = per_student.get(row["Student_name"], 0) + 1
+        per_course[row["coursecode"]] = per_course.get(row["coursecode"], 0) + 1
+        key = (row["Student_name"], row["coursecode"], row["date"])
+        per_day[key] = per_day.get(key, 0) + 1
+
+    student_totals.bulk_write([
+        UpdateOne({"_id": name}, {"$inc": {"count": n}}, upsert=True)
+        for name, n in per_student.items()
+    ], ordered=False)
+    course_totals.bulk_write([
+        UpdateOne({"_id": code}, {"$inc": {"count": n}}, upsert=True)
+        for code, n in per_course.items()
+    ], ordered=False)
+    daily_counts.bulk_write([
+        UpdateOne(
+            {"_id": {"Student_name": name, "coursecode": code, "date": date}},
+            {"$inc": {"count": n}, "$setOnInsert": {"Student_name": name, "coursecode": code, "date": date}},
+            upsert=True
+        )
+        for (name, code, date), n in per_day.items()
+    ], ordered=False)
+
+
+def query_counts(group_by="student", coursecode=None, date_from=None, date_to=None):
+    """Attendance counts grouped by student, course or day, as [{_id, count}].
+
+    Unfiltered student/course totals are read directly from their counter
+    collections; anything filtered is aggregated from the daily summary.
+    """
+    if not (coursecode or date_from or date_to):
+        if group_by == "student":
+            return list(student_totals.find().sort("_id", 1))
+        if group_by == "course":
+            return list(course_totals.find().sort("_id", 1))
+
+    match = {}
+    if coursecode:
+        match["coursecode"] = coursecode
+    if date_from or date_to:
+        match["date"] = {}
+        if date_from:
+            match["date"]["$gte"] = date_from
+        if date_to:
+            match["date"]["$lte"] = date_to
+
+    field = {"student": "$Student_name", "course": "$coursecode", "day": "$date"}[group_by]
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": field, "count": {"$sum": "$count"}}},
+        {"$sort": {"_id": 1}}
+    ]
+    return list(daily_counts.aggregate(pipeline))
+
+
+def rebuild():
+    """Recompute every summary from the raw attendance collection (backfill)."""
+    date_expr = {"$ifNull": ["$date", {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}]}
+    course_expr = {"$ifNull": ["$coursecode", "UNKNOWN"]}
+
+    db.attendance.aggregate([
+        {"$group": {
+            "_id": {"Student_name": "$Student_name", "coursecode": course_expr, "date": date_expr},
+            "count": {"$sum": 1}
+        }},
+        {"$addFields": {
+            "Student_name": "$_id.Student_name",
+            "coursecode": "$_id.coursecode",
+            "date": "$_id.date"
+        }},
+        {"$out": daily_counts.name}
+    ])
+    daily_counts.aggregate([
+        {"$group": {"_id": "$Student_name", "count": {"$sum": "$count"}}},
+        {"$out": student_totals.name}
+    ])
+    daily_counts.aggregate([
+        {"$group": {"_id": "$coursecode", "count": {"$sum": "$count"}}},
+        {"$out": course_totals.name}
+    ])
+    daily_counts.create_index([("date", 1), ("coursecode", 1)])
+    daily_counts.create_index([("coursecode", 1), ("date", 1)])
+
+    return {
+        "students": student_totals.estimated_document_count(),
+        "courses": course_totals.estimated_document_count(),
+        "daily_rows": daily_counts.estimated_document_count()
+    }
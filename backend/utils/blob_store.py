@@ -0,0 +1,64 @@
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+import gridfs
+from gridfs.errors import FileExists
+from PIL import Image
+from pymongo import MongoClient
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+THUMBNAIL_MAX_SIDE = int(os.getenv("PHOTO_THUMBNAIL_MAX_SIDE", "256"))
+
+
+class BlobStore:
+    """Content-addressed blobs in GridFS, keyed by the SHA-256 of their bytes.
+
+    Storing the same bytes twice is a no-op, so duplicate uploads cost one
+    existence check instead of another copy of the file.
+    """
+
+    def __init__(self, database, bucket):
+        self.fs = gridfs.GridFS(database, collection=bucket)
+
+    def put(self, data, content_type=None):
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.fs.exists(digest):
+            try:
+                self.fs.put(data, _id=digest, content_type=content_type)
+            except FileExists:
+                pass  # stored by a concurrent upload
+        return digest
+
+    def get(self, digest):
+        try:
+            grid_out = self.fs.get(digest)
+        except gridfs.errors.NoFile:
+            return None, None
+        return grid_out.read(), grid_out.content_type
+
+
+def describe_image(image_bytes, max_side=THUMBNAIL_MAX_SIDE):
+    """Return width, height, MIME type and a small base64 JPEG thumbnail."""
+    img = Image.open(BytesIO(image_bytes))
+    width, height = img.size
+    content_type = Image.MIME.get(img.format)
+
+    thumb = img.convert("RGB")
+    thumb.thumbnail((max_side, max_side))
+    buf = BytesIO()
+    thumb.save(buf, format="JPEG", quality=70)
+
+    return {
+        "width": width,
+        "height": height,
+        "content_type": content_type,
+        "thumbnail_base64": base64.b64encode(buf.getvalue()).decode()
+    }
+
+
+photo_store = BlobStore(db, "photos")
+known_face_store = BlobStore(db, "known_face_images")
@@ -0,0 +1,215 @@
+import os
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from posixpath import basename, splitext
+
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+
+from utils.blob_store import known_face_store
+from utils.face_client import encode_largest_face_many
+from utils.face_encoding import encoding_to_binary
+from utils.face_index import known_face_index, read_known_face, FACE_MAX_PROTOTYPES
+from utils.face_matching import elapsed_ms, quality_error
+from utils.image_preprocess import IMAGE_EXTENSIONS
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+ENROLL_MAX_ARCHIVE_BYTES = int(os.getenv("ENROLL_MAX_ARCHIVE_BYTES", str(1024 * 1024 * 1024)))
+# Uploaded archives wait here for their job; only one chunk of images is ever in memory
+ENROLL_SPOOL_DIR = os.getenv("ENROLL_SPOOL_DIR") or tempfile.gettempdir()
+# Images sent to the encoder per call; bounds message size and paces progress reports
+ENROLL_CHUNK_SIZE = int(os.getenv("ENROLL_CHUNK_SIZE", "64"))
+
+
+class ArchiveTooLarge(ValueError):
+    pass
+
+
+def merge_prototypes(existing, encodings):
+    """(centroid, prototypes) after adding ``encodings`` to a known_faces document.
+
+    ``existing`` may be None or a pre-prototype document; the most recent
+    FACE_MAX_PROTOTYPES encodings are kept.
+    """
+    prototypes = list(encodings)
+    if existing and existing.get("encoding") is not None:
+        prototypes = list(read_known_face(existing)[1]) + prototypes
+    prototypes = np.vstack(prototypes[-FACE_MAX_PROTOTYPES:])
+    return prototypes.mean(axis=0), prototypes
+
+
+def label_images(paths):
+    """Person label for each image path: ``name.jpg`` or ``regno/<anything>.jpg``.
+
+    A single folder wrapping the whole archive (as zip tools often add) is
+    ignored when there are person folders below it, so
+    ``intake/R123/a.jpg`` is labelled ``R123``; an archive holding one
+    ``R123/`` folder is still one person.
+    """
+    parts = [[p for p in path.replace("\\", "/").split("/") if p] for path in paths]
+    if parts and all(len(p) > 2 for p in parts) and len({p[0] for p in parts}) == 1:
+        parts = [p[1:] for p in parts]
+    return [p[-2] if len(p) > 1 else splitext(p[-1])[0] for p in parts]
+
+
+def _is_image(path):
+    name = basename(path.replace("\\", "/"))
+    return not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_labelled_archive(zf):
+    """[(label, path)] for every image in an open ZipFile; read them with ``zf.read``."""
+    infos = [
+        info for info in zf.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/") and _is_image(info.filename)
+    ]
+    if sum(info.file_size for info in infos) > ENROLL_MAX_ARCHIVE_BYTES:
+        raise ArchiveTooLarge("Archive is too large")
+    paths = [info.filename for info in infos]
+    return list(zip(label_images(paths), paths))
+
+
+def list_labelled_directory(root):
+    """[(label, path)] for every image below ``root``, paths relative to it with / separators."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        paths.extend(os.path.relpath(os.path.join(dirpath, f), root) for f in sorted(filenames) if _is_image(f))
+    paths = [path.replace(os.sep, "/") for path in paths]
+    return list(zip(label_images(paths), paths))
+
+
+def directory_reader(root):
+    def read(path):
+        with open(os.path.join(root, path), "rb") as fh:
+            return fh.read()
+    return read
+
+
+def read_labelled_directory(root):
+    """[(label, path, bytes)] for every image below ``root``."""
+    read = directory_reader(root)
+    return [(label, path, read(path)) for label, path in list_labelled_directory(root)]
+
+
+def spool_archive(stream, limit=ENROLL_MAX_ARCHIVE_BYTES):
+    """Copy an uploaded archive to a temporary file; enroll_archive deletes it.
+
+    Raises ArchiveTooLarge, leaving nothing behind, once more than ``limit``
+    bytes have been read.
+    """
+    fd, path = tempfile.mkstemp(prefix="enroll-", suffix=".zip", dir=ENROLL_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            copied = 0
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if copied > limit:
+                    raise ArchiveTooLarge("Archive is too large")
+                fh.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def resolve_names(labels):
+    """Map labels to known-face names; labels that are a student's regno become that student's name."""
+    names = {label: label for label in labels}
+    for student in db.Students.find({"Student_regno": {"$in": list(names)}}, {"name": 1, "Student_regno": 1}):
+        if student.get("name"):
+            names[student["Student_regno"]] = student["name"]
+    return names
+
+
+def enroll_archive(report, archive_path, dry_run=False):
+    """bulk_enroll over a spooled zip archive, which is deleted afterwards."""
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            return bulk_enroll(report, list_labelled_archive(zf), zf.read, dry_run=dry_run)
+    finally:
+        os.remove(archive_path)
+
+
+def bulk_enroll(report, images, read, dry_run=False):
+    """Encode labelled images in parallel and enroll everyone in one bulk write.
+
+    ``images`` is [(label, path)] and ``read(path)`` returns an image's
+    bytes; images are read one chunk at a time and stored in
+    known_face_images as soon as they are encoded. Every usable photo
+    becomes a prototype of its person, merged with what is already
+    enrolled. Returns a report with per-image failures.
+    """
+    timings = {}
+    failures, encoded = [], {}
+
+    start = time.perf_counter()
+    for offset in range(0, len(images), ENROLL_CHUNK_SIZE):
+        chunk = images[offset:offset + ENROLL_CHUNK_SIZE]
+        chunk_bytes = [read(path) for _, path in chunk]
+        results = encode_largest_face_many(chunk_bytes, "enroll")
+        for (label, path), image_bytes, (encoding, details, error) in zip(chunk, chunk_bytes, results):
+            if encoding is None:
+                failures.append({
+                    "path": path,
+                    "label": label,
+                    "error": error or quality_error(details) or "No face found"
+                })
+                continue
+            digest = None if dry_run else known_face_store.put(image_bytes)
+            encoded.setdefault(label, []).append((encoding, digest))
+        report("encoding", 5 + int(70 * min(offset + len(chunk), len(images)) / max(len(images), 1)))
+    timings["encode_ms"] = elapsed_ms(start)
+
+    report("writing", 80)
+    start = time.perf_counter()
+    names = resolve_names(encoded)
+    people = {}
+    for label, faces in encoded.items():
+        people.setdefault(names[label], []).extend(faces)
+
+    existing = {
+        face["name"]: face
+        for face in db.known_faces.find({"name": {"$in": list(people)}}, {"name": 1, "encoding": 1, "prototypes": 1})
+    }
+
+    ops = []
+    now = datetime.utcnow()
+    for name, faces in people.items():
+        centroid, prototypes = merge_prototypes(existing.get(name), [encoding for encoding, _ in faces])
+        fields = {
+            "encoding": encoding_to_binary(centroid),
+            "prototypes": [encoding_to_binary(p) for p in prototypes],
+            "image_sha256": faces[-1][1],
+            "updated_at": now,
+        }
+        ops.append(UpdateOne({"name": name}, {"$set": fields, "$unset": {"image_base64": ""}}, upsert=True))
+
+    if ops and not dry_run:
+        db.known_faces.bulk_write(ops, ordered=False)
+    timings["write_ms"] = elapsed_ms(start)
+
+    index_version = known_face_index.version
+    if ops and not dry_run:
+        report("indexing", 90)
+        known_face_index.reload()
+        index_version = known_face_index.version
+
+    return {
+        "images": len(images),
+        "encoded": sum(len(faces) for faces in people.values()),
+        "enrolled": len(people),
+        "new": len(set(people) - set(existing)),
+        "failed": len(failures),
+        "failures": failures,
+        "dry_run": dry_run,
+        "index_version": index_version,
+        "timings": timings
+    }
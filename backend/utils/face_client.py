@@ -0,0 +1,135 @@
+import os
+import threading
+from multiprocessing.connection import Client
+
+from utils.face_matching import match_encodings
+from utils.image_preprocess import FaceImageError
+
+FACE_WORKER_ADDRESS = os.getenv("FACE_WORKER_ADDRESS", "")
+# The worker unpickles whatever an authenticated peer sends, so there is no default key
+FACE_WORKER_AUTHKEY = os.getenv("FACE_WORKER_AUTHKEY", "").encode()
+# Run in-process when the worker is unreachable; off by default so web workers never load dlib
+FACE_WORKER_FALLBACK = os.getenv("FACE_WORKER_FALLBACK", "0") not in ("0", "false", "no")
+
+
+class FaceWorkerUnavailable(RuntimeError):
+    pass
+
+
+def require_authkey():
+    if not FACE_WORKER_AUTHKEY:
+        raise RuntimeError("FACE_WORKER_ADDRESS is set but FACE_WORKER_AUTHKEY is not; "
+                           "set it to the same random secret for the web app and face_worker.py")
+    return FACE_WORKER_AUTHKEY
+
+
+def worker_address(value=FACE_WORKER_ADDRESS):
+    """"host:port" for TCP, anything else is a Unix socket path (or a Windows pipe name)."""
+    host, _, port = value.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return value
+
+
+class FaceWorkerClient:
+    """Sends detect/encode calls to face_worker.py.
+
+    Each thread keeps its own connection; a dropped connection (e.g. the
+    worker restarted) is reopened once before giving up. Exceptions raised in
+    the worker are re-raised here unchanged.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, op, *args, **kwargs):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((op, args, kwargs))
+                status, result = conn.recv()
+                break
+            except (OSError, EOFError) as e:
+                self._drop()
+                if attempt:
+                    raise FaceWorkerUnavailable(f"Face worker at {self.address} unavailable: {e}") from e
+
+        if status == "error":
+            raise result
+        return result
+
+
+_client = FaceWorkerClient(worker_address(), require_authkey()) if FACE_WORKER_ADDRESS else None
+
+
+def _in_process():
+    # Imported on first use so that web workers talking to a face worker never load dlib/cv2
+    from utils import face_utils
+    return face_utils
+
+
+def _call(op, *args, **kwargs):
+    if _client is not None:
+        try:
+            return _client.call(op, *args, **kwargs)
+        except FaceWorkerUnavailable as e:
+            if not FACE_WORKER_FALLBACK:
+                raise
+            print(f"{e}; running {op} in-process")
+    return getattr(_in_process(), op)(*args, **kwargs)
+
+
+def detect_and_encode(image_bytes, profile="attendance", max_side=None, upsample=None):
+    return _call("detect_and_encode", image_bytes, profile, max_side=max_side, upsample=upsample)
+
+
+def encode_largest_face(image_bytes, profile):
+    return _call("encode_largest_face", image_bytes, profile)
+
+
+def detect_and_encode_many(images, profile="attendance"):
+    return _call("detect_and_encode_many", list(images), profile)
+
+
+def encode_largest_face_many(images, profile="enroll"):
+    return _call("encode_largest_face_many", list(images), profile)
+
+
+def recognize_faces_from_bytes(image_bytes, gallery, threshold=None, partition=None, fallback=True):
+    """Detect, encode and match one photo.
+
+    An undecodable photo counts as one with no faces; worker and connection
+    errors propagate so the job running this is marked failed. Returns
+    (present, unknown, total, timings, rejected, matches).
+    """
+    try:
+        face_encs, _, timings, rejected = detect_and_encode(image_bytes)
+    except FaceImageError as e:
+        print("Recognition failed:", e)
+        return [], 0, 0, {}, {}, {}
+
+    present, match_timings, matches = match_encodings(
+        face_encs, gallery, threshold, partition=partition, fallback=fallback
+    )
+    timings.update(match_timings)
+
+    unknown = len(face_encs) - len(present)
+    return present, unknown, len(face_encs), timings, rejected, matches
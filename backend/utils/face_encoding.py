@@ -0,0 +1,36 @@
+import json
+import numpy as np
+from bson.binary import Binary
+
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.dtype("<f4")
+
+
+def encoding_to_binary(encoding):
+    """Pack a 128-d face encoding into 512 bytes of little-endian float32."""
+    vector = np.asarray(encoding, dtype=ENCODING_DTYPE).reshape(ENCODING_DIM)
+    return Binary(vector.tobytes())
+
+
+def decode_encoding(value):
+    """Read a stored encoding in any of the formats we have written.
+
+    New documents hold BSON binary; older ones hold a JSON string
+    (known_faces) or a list of floats (users.facedata).
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        vector = np.frombuffer(value, dtype=ENCODING_DTYPE)
+    else:
+        if isinstance(value, str):
+            value = json.loads(value)
+        vector = np.asarray(value, dtype=np.float32)
+
+    if vector.size != ENCODING_DIM:
+        raise ValueError(f"Expected {ENCODING_DIM} values, got {vector.size}")
+    return vector.astype(np.float32, copy=False).reshape(ENCODING_DIM)
+
+
+def is_binary_encoding(value):
+    return isinstance(value, (bytes, bytearray))
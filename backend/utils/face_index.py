@@ -0,0 +1,417 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import MongoClient
+
+from utils.face_encoding import ENCODING_DIM, decode_encoding
+from utils.nn_search import build_search
+from utils.shared_gallery import default_store, store_namespace
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+FACE_MAX_PROTOTYPES = int(os.getenv("FACE_MAX_PROTOTYPES", "5"))
+FACE_LOGIN_THRESHOLD = float(os.getenv("FACE_LOGIN_THRESHOLD", "0.6"))
+FACE_LOGIN_ANN_MIN_SIZE = int(os.getenv("FACE_LOGIN_ANN_MIN_SIZE", "5000"))
+FACE_LOGIN_IVF_NPROBE = int(os.getenv("FACE_LOGIN_IVF_NPROBE", "8"))
+# Share of IVF lists probed per login; FACE_LOGIN_IVF_NPROBE is the floor
+FACE_LOGIN_IVF_PROBE_FRACTION = float(os.getenv("FACE_LOGIN_IVF_PROBE_FRACTION", "0.1"))
+# Full rescans of users pick up deletions and out-of-band facedata edits
+FACE_LOGIN_RELOAD_SECONDS = float(os.getenv("FACE_LOGIN_RELOAD_SECONDS", "600"))
+FACE_LOGIN_CATCH_UP_OVERLAP_SECONDS = float(os.getenv("FACE_LOGIN_CATCH_UP_OVERLAP_SECONDS", "120"))
+
+
+class GallerySnapshot(namedtuple("GallerySnapshot", "encodings names version prototypes proto_offsets")):
+    """Immutable view of the gallery for one request.
+
+    ``encodings`` holds one centroid per person; the prototypes of row ``i``
+    are ``prototypes[proto_offsets[i]:proto_offsets[i + 1]]``.
+    """
+
+    def prototypes_of(self, row):
+        return self.prototypes[self.proto_offsets[row]:self.proto_offsets[row + 1]]
+
+
+def empty_gallery(version=0):
+    return GallerySnapshot(
+        np.empty((0, ENCODING_DIM), dtype=np.float32), [], version,
+        np.empty((0, ENCODING_DIM), dtype=np.float32), np.zeros(1, dtype=np.int64)
+    )
+
+
+def build_gallery(people, version=0):
+    """GallerySnapshot from [(name, centroid, prototypes)]."""
+    if not people:
+        return empty_gallery(version)
+    names = [name for name, _, _ in people]
+    centroids = np.vstack([centroid for _, centroid, _ in people]).astype(np.float32, copy=False)
+    protos = [np.asarray(p, dtype=np.float32).reshape(-1, ENCODING_DIM) for _, _, p in people]
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in protos])]).astype(np.int64)
+    return GallerySnapshot(centroids, names, version, np.vstack(protos), offsets)
+
+
+def read_known_face(face):
+    """(centroid, prototypes) from a known_faces document, including pre-prototype ones."""
+    centroid = decode_encoding(face["encoding"])
+    prototypes = [decode_encoding(p) for p in face.get("prototypes") or []]
+    if not prototypes:
+        prototypes = [centroid]
+    return centroid, np.vstack(prototypes)
+
+
+def upsert_gallery(gallery, positions, name, centroid, prototypes, version=0):
+    """New GallerySnapshot with ``name`` added or replaced; ``gallery`` is left untouched."""
+    pos = positions.get(name)
+    if pos is None:
+        return GallerySnapshot(
+            np.vstack([gallery.encodings, centroid[None, :]]),
+            list(gallery.names) + [name],
+            version,
+            np.vstack([gallery.prototypes, prototypes]),
+            np.append(gallery.proto_offsets, gallery.proto_offsets[-1] + len(prototypes)),
+        )
+
+    encodings = np.array(gallery.encodings)
+    encodings[pos] = centroid
+    start, end = gallery.proto_offsets[pos], gallery.proto_offsets[pos + 1]
+    offsets = np.array(gallery.proto_offsets)
+    offsets[pos + 1:] += len(prototypes) - (end - start)
+    return GallerySnapshot(
+        encodings,
+        gallery.names,
+        version,
+        np.vstack([gallery.prototypes[:start], prototypes, gallery.prototypes[end:]]),
+        offsets,
+    )
+
+
+class KnownFaceIndex:
+    """Copy of the known_faces gallery used for matching.
+
+    Each person contributes one centroid row to a float32 matrix (the hot path
+    for matching) plus up to FACE_MAX_PROTOTYPES prototype encodings that are
+    only consulted for near-threshold candidates. Snapshots are replaced,
+    never mutated, so readers can keep using one while an upsert lands.
+
+    With a SharedGalleryStore the arrays are published once to memory-mapped
+    files that every worker maps read-only; the generation number doubles as
+    the index version, and workers remap when another one publishes. A
+    process starting up only reuses a published generation whose source
+    (document count and latest ``updated_at``, which every write to
+    known_faces sets) still matches the collection, and rebuilds it
+    otherwise.
+    """
+
+    def __init__(self, collection, store=None):
+        self.collection = collection
+        self.store = store
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._gallery = empty_gallery()
+        self._positions = {}
+        self._stamp = None
+        self._loaded = False
+        self.version = 0
+        self.loaded_at = None
+        self.updated_at = None
+
+    def _read_collection(self):
+        people = []
+        for face in self.collection.find({}, {"name": 1, "encoding": 1, "prototypes": 1}):
+            try:
+                centroid, prototypes = read_known_face(face)
+                people.append((face["name"], centroid, prototypes))
+            except Exception as e:
+                print(f"Failed to load face for {face.get('name')}: {e}")
+        return people
+
+    def _source(self):
+        """Cheap fingerprint of the collection a gallery is built from."""
+        newest = list(self.collection.find({"updated_at": {"$exists": True}}, {"updated_at": 1})
+                      .sort("updated_at", -1).limit(1))
+        return {
+            "count": self.collection.estimated_document_count(),
+            "updated_at": newest[0]["updated_at"].isoformat() if newest else None,
+        }
+
+    def _install(self, gallery):
+        """Swap in a new gallery. Caller holds self._lock."""
+        self._gallery = gallery
+        self._positions = {name: i for i, name in enumerate(gallery.names)}
+        self.version = gallery.version
+        self._loaded = True
+        self.updated_at = datetime.utcnow()
+
+    def _publish(self, gallery, source=None):
+        """Publish to the shared store and install the mapped copy. Caller holds store.lock()."""
+        self.store.publish(gallery.names, gallery._asdict(), source or self._source())
+        self._remap()
+
+    def _remap(self):
+        """Map the store's current generation; False if nothing is published yet."""
+        stamp = self.store.stamp()
+        loaded = self.store.load()
+        if loaded is None:
+            return False
+        generation, names, arrays = loaded
+        with self._lock:
+            self._install(GallerySnapshot(
+                arrays["encodings"], names, generation, arrays["prototypes"], arrays["proto_offsets"]
+            ))
+            self._stamp = stamp
+            self.loaded_at = self.loaded_at or self.updated_at
+        return True
+
+    def reload(self):
+        """Rebuild from Mongo (and republish, when shared)."""
+        if self.store is None:
+            people = self._read_collection()
+            with self._lock:
+                self._install(build_gallery(people, self.version + 1))
+                self.loaded_at = self.updated_at
+            return
+
+        with self.store.lock():
+            source = self._source()  # taken first, so writes during the scan make it look stale
+            people = self._read_collection()
+            self._publish(build_gallery(people), source)
+        self.loaded_at = self.updated_at
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if self.store is None:
+                self.reload()
+                return
+
+            # Another worker may already have published; mapping it skips the
+            # Mongo scan, but only if the collection has not changed since
+            # (previous run, out-of-band delete, migration)
+            with self.store.lock():
+                source = self._source()
+                if self.store.source() == source and self._remap():
+                    return
+                people = self._read_collection()
+                self._publish(build_gallery(people), source)
+            self.loaded_at = self.updated_at
+
+    def refresh(self):
+        """Pick up a generation published by another worker, if any."""
+        if self.store is None:
+            return
+        if self.store.stamp() != self._stamp:
+            with self._load_lock:
+                if self.store.stamp() != self._stamp:
+                    self._remap()
+
+    def upsert(self, name, centroid, prototypes=None):
+        """Insert or replace a single person without rescanning the collection."""
+        self.ensure_loaded()
+        centroid = np.asarray(centroid, dtype=np.float32).reshape(ENCODING_DIM)
+        prototypes = centroid[None, :] if prototypes is None else np.asarray(prototypes, dtype=np.float32)
+
+        if self.store is None:
+            with self._lock:
+                self._install(upsert_gallery(self._gallery, self._positions, name, centroid, prototypes,
+                                             self.version + 1))
+            return
+
+        # Build on the latest published generation so concurrent enrollments
+        # in different workers are not lost
+        with self.store.lock():
+            self._remap()
+            with self._lock:
+                gallery, positions = self._gallery, self._positions
+            self._publish(upsert_gallery(gallery, positions, name, centroid, prototypes))
+
+    def snapshot(self):
+        """GallerySnapshot that stays consistent for one request."""
+        self.ensure_loaded()
+        self.refresh()
+        with self._lock:
+            return self._gallery
+
+    def partition_snapshot(self, names):
+        """Like snapshot(), plus the gallery rows belonging to ``names`` (e.g. a course roster)."""
+        self.ensure_loaded()
+        self.refresh()
+        with self._lock:
+            rows = sorted(self._positions[name] for name in set(names) if name in self._positions)
+            return self._gallery, np.asarray(rows, dtype=np.int64)
+
+    def stats(self):
+        self.ensure_loaded()
+        self.refresh()
+        with self._lock:
+            size = len(self._gallery.names)
+            stats = {
+                "version": self.version,
+                "size": size,
+                "prototypes": int(self._gallery.proto_offsets[-1]),
+                "shared": self.store is not None,
+                "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+                "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            }
+        try:
+            db_count = self.collection.estimated_document_count()
+            stats["db_count"] = db_count
+            stats["stale"] = db_count != size
+        except Exception as e:
+            print(f"Failed to count known faces: {e}")
+        return stats
+
+
+class FaceLoginIndex:
+    """Nearest-neighbour index over users.facedata for 1:N face login.
+
+    Small galleries use an exact flat scan; from FACE_LOGIN_ANN_MIN_SIZE users
+    up an IVF index is built instead; a search whose best IVF hit is over
+    FACE_LOGIN_THRESHOLD is repeated as an exact scan, so a genuine user
+    in an unprobed list is still found. Every write of facedata stamps
+    ``face_updated_at``, and before each search users stamped since the last
+    load (possibly by another worker or host) are picked up. The query
+    reaches FACE_LOGIN_CATCH_UP_OVERLAP_SECONDS back, since writers' clocks
+    and commit order do not agree exactly; a user seen again with the same
+    stamp is skipped, one with a newer stamp replaces its old row. Deletions
+    and writes that do not stamp are picked up by a full reload every
+    FACE_LOGIN_RELOAD_SECONDS.
+    """
+
+    def __init__(self, collection, ann_min_size=FACE_LOGIN_ANN_MIN_SIZE, n_probe=FACE_LOGIN_IVF_NPROBE,
+                 probe_fraction=FACE_LOGIN_IVF_PROBE_FRACTION, threshold=FACE_LOGIN_THRESHOLD,
+                 reload_seconds=FACE_LOGIN_RELOAD_SECONDS, overlap_seconds=FACE_LOGIN_CATCH_UP_OVERLAP_SECONDS):
+        self.collection = collection
+        self.ann_min_size = ann_min_size
+        self.n_probe = n_probe
+        self.probe_fraction = probe_fraction
+        self.threshold = threshold
+        self.reload_seconds = reload_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._search = None
+        self._user_ids = []
+        self._rows = {}
+        self._stamps = {}
+        self._dead = 0
+        self._watermark = None
+        self._reloaded = None
+        self.version = 0
+        self.loaded_at = None
+
+    def _read_users(self, query):
+        users = []
+        for user in self.collection.find(query, {"facedata": 1, "face_updated_at": 1}):
+            if not user.get("facedata"):
+                continue
+            try:
+                users.append((str(user["_id"]), decode_encoding(user["facedata"]), user.get("face_updated_at")))
+            except Exception as e:
+                print(f"Failed to load facedata for user {user['_id']}: {e}")
+        return users
+
+    def _advance(self, users):
+        stamps = [stamp for _, _, stamp in users if stamp is not None]
+        if stamps and (self._watermark is None or max(stamps) > self._watermark):
+            self._watermark = max(stamps)
+
+    def reload(self):
+        with self._update_lock:
+            self._reload()
+
+    def _reload(self):
+        users = self._read_users({})
+        matrix = np.vstack([enc for _, enc, _ in users]) if users else np.empty((0, ENCODING_DIM), dtype=np.float32)
+        search = build_search(matrix, self.ann_min_size, self.n_probe, self.probe_fraction)
+
+        with self._lock:
+            self._search = search
+            self._user_ids = [user_id for user_id, _, _ in users]
+            self._rows = {user_id: row for row, (user_id, _, _) in enumerate(users)}
+            self._stamps = {user_id: stamp for user_id, _, stamp in users}
+            self._dead = 0
+            self._watermark = None
+            self._advance(users)
+            self._reloaded = time.monotonic()
+            self.version += 1
+            self.loaded_at = datetime.utcnow()
+
+    def catch_up(self):
+        """Add or replace users whose face was written since the last load or catch-up."""
+        with self._update_lock:
+            if self._search is None or time.monotonic() - self._reloaded >= self.reload_seconds:
+                self._reload()
+                return
+
+            if self._watermark is None:
+                query = {"face_updated_at": {"$exists": True}}
+            else:
+                query = {"face_updated_at": {"$gte": self._watermark - self.overlap}}
+            users = [
+                (user_id, enc, stamp) for user_id, enc, stamp in self._read_users(query)
+                if self._stamps.get(user_id) != stamp
+            ]
+            if not users:
+                return
+
+            with self._lock:
+                first = len(self._user_ids)
+                for offset, (user_id, _, stamp) in enumerate(users):
+                    self._retire(user_id)
+                    self._user_ids.append(user_id)
+                    self._rows[user_id] = first + offset
+                    self._stamps[user_id] = stamp
+                self._search.add(np.vstack([enc for _, enc, _ in users]))
+                self._advance(users)
+                self.version += 1
+
+    def _retire(self, user_id):
+        """Stop returning a user's current row. Caller holds self._lock."""
+        row = self._rows.pop(user_id, None)
+        if row is not None:
+            self._user_ids[row] = None
+            self._dead += 1
+
+    def discard(self, user_id):
+        """Forget a user that no longer exists, until the next full reload."""
+        with self._lock:
+            self._retire(user_id)
+
+    def search(self, encoding, k=1):
+        """Return [(user_id, distance)] for the k closest enrolled faces."""
+        self.catch_up()
+        with self._lock:
+            search, user_ids = self._search, self._user_ids
+            if len(search) - self._dead <= 0:
+                return []
+            # Replaced and discarded rows stay in the search structure until the next reload
+            query = np.asarray(encoding, dtype=np.float32)
+            idx, dist = search.search(query, k + self._dead)
+            matches = [(user_ids[i], float(d)) for i, d in zip(idx, dist) if user_ids[i] is not None]
+            if search.kind != "flat" and (not matches or matches[0][1] > self.threshold):
+                idx, dist = search.exact_search(query, k + self._dead)
+                matches = [(user_ids[i], float(d)) for i, d in zip(idx, dist) if user_ids[i] is not None]
+        return matches[:k]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "size": len(self._user_ids) - self._dead,
+                "retired_rows": self._dead,
+                "kind": self._search.kind if self._search is not None else None,
+                "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            }
+
+
+known_face_index = KnownFaceIndex(
+    db.known_faces, store=default_store(store_namespace(os.getenv("MONGO_URI"), db.known_faces.full_name))
+)
+face_login_index = FaceLoginIndex(db.users)
@@ -0,0 +1,121 @@
+import os
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.45"))
+# Faces within this distance above the threshold of a centroid get a second look against its prototypes
+PROTOTYPE_MARGIN = float(os.getenv("FACE_PROTOTYPE_MARGIN", "0.1"))
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def face_distance_matrix(face_encs, known_encs):
+    """Euclidean distances between every detected face and every known face, shape (faces, gallery)."""
+    faces = np.asarray(face_encs, dtype=np.float32)
+    gallery = np.asarray(known_encs, dtype=np.float32)
+    sq = (
+        np.einsum("ij,ij->i", faces, faces)[:, None]
+        + np.einsum("ij,ij->i", gallery, gallery)[None, :]
+        - 2.0 * faces @ gallery.T
+    )
+    return np.sqrt(np.maximum(sq, 0.0))
+
+def gallery_distances(face_encs, gallery, threshold, rows=None):
+    """Face-to-person distances, centroid first.
+
+    The full matrix is computed against one centroid per person only. Cells
+    that miss the threshold by less than PROTOTYPE_MARGIN are re-scored with
+    the closest of that person's prototypes, so someone enrolled from several
+    photos still matches a face that resembles just one of them.
+    """
+    rows = np.arange(len(gallery.names)) if rows is None else rows
+    faces = np.asarray(face_encs, dtype=np.float32)
+    distances = face_distance_matrix(faces, gallery.encodings[rows])
+
+    near = (distances >= threshold) & (distances < threshold + PROTOTYPE_MARGIN)
+    for c in np.flatnonzero(near.any(axis=0)):
+        prototypes = gallery.prototypes_of(rows[c])
+        if len(prototypes) < 2:
+            continue
+        f = np.flatnonzero(near[:, c])
+        closest = face_distance_matrix(faces[f], prototypes).min(axis=1)
+        distances[f, c] = np.minimum(distances[f, c], closest)
+    return distances
+
+def assign_faces(distances, threshold):
+    """One-to-one assignment of faces to known people minimising total distance.
+
+    Only gallery columns that some face could match under the threshold take
+    part in the assignment, so the solver stays small for large galleries.
+    Returns a list of (face_index, gallery_index) pairs.
+    """
+    if distances.size == 0:
+        return []
+
+    candidate_cols = np.flatnonzero((distances < threshold).any(axis=0))
+    if candidate_cols.size == 0:
+        return []
+
+    sub = distances[:, candidate_cols]
+    cost = np.where(sub < threshold, sub, threshold + 1.0)
+    rows, cols = linear_sum_assignment(cost)
+
+    return [
+        (int(r), int(candidate_cols[c]))
+        for r, c in zip(rows, cols)
+        if sub[r, c] < threshold
+    ]
+
+def quality_error(details):
+    """Error message for a single-face endpoint that got no usable face."""
+    reasons = [reason for reason, count in details.get("rejected", {}).items() if count]
+    if reasons:
+        return f"Face image quality too low ({', '.join(reasons).replace('_', ' ')})"
+    return None
+
+def match_encodings(face_encs, gallery, threshold=None, partition=None, fallback=True):
+    """Assign detected faces to known people in a GallerySnapshot.
+
+    With ``partition`` (gallery row indices, e.g. a course roster) faces are
+    matched against those rows first; only faces left unmatched fall back to
+    the whole gallery, and never to someone already assigned.
+
+    Returns (names, timings, match counts); the counts say how many faces
+    were matched from the partition and by falling back, and are empty
+    without a partition.
+    """
+    threshold = MATCH_THRESHOLD if threshold is None else threshold
+    start = time.perf_counter()
+    timings, matches = {}, {}
+    if partition is not None:
+        matches = {"partition": 0, "fallback": 0}
+    if len(face_encs) == 0 or len(gallery.names) == 0:
+        timings["match_ms"] = elapsed_ms(start)
+        return [], timings, matches
+
+    if partition is None:
+        distances = gallery_distances(face_encs, gallery, threshold)
+        present = [gallery.names[g] for _, g in assign_faces(distances, threshold)]
+        timings["match_ms"] = elapsed_ms(start)
+        return present, timings, matches
+
+    matched_faces, assigned = set(), []
+    if len(partition) > 0:
+        distances = gallery_distances(face_encs, gallery, threshold, rows=partition)
+        for f, g in assign_faces(distances, threshold):
+            matched_faces.add(f)
+            assigned.append(int(partition[g]))
+    matches["partition"] = len(assigned)
+
+    rest = [f for f in range(len(face_encs)) if f not in matched_faces]
+    if fallback and rest:
+        distances = gallery_distances(face_encs[rest], gallery, threshold)
+        distances[:, assigned] = np.inf
+        for _, g in assign_faces(distances, threshold):
+            assigned.append(g)
+            matches["fallback"] += 1
+
+    timings["match_ms"] = elapsed_ms(start)
+    return [gallery.names[g] for g in assigned], timings, matches
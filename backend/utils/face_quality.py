@@ -0,0 +1,88 @@
+import os
+
+import cv2
+import numpy as np
+import face_recognition
+
+# Cheap per-face checks run between detection and the (expensive) encoding step
+FACE_MIN_SIZE = int(os.getenv("FACE_MIN_SIZE", "32"))
+FACE_MIN_SHARPNESS = float(os.getenv("FACE_MIN_SHARPNESS", "20"))
+FACE_MIN_LANDMARK_SCORE = float(os.getenv("FACE_MIN_LANDMARK_SCORE", "0.6"))
+
+SHARPNESS_CROP = 96
+REJECT_REASONS = ("too_small", "blurry", "bad_landmarks")
+
+
+def sharpness(gray, box):
+    """Variance of the Laplacian over the face crop, resized so scores are comparable across sizes."""
+    top, right, bottom, left = box
+    crop = gray[top:bottom, left:right]
+    if crop.size == 0:
+        return 0.0
+    crop = cv2.resize(crop, (SHARPNESS_CROP, SHARPNESS_CROP), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def landmark_score(landmarks, box):
+    """Plausibility of the 5-point landmarks for a frontal, unoccluded face (0..1).
+
+    dlib's shape predictor has no confidence output, so we score the geometry
+    instead: share of points inside the box, eye spacing relative to the box
+    width, and the nose sitting between the eyes.
+    """
+    top, right, bottom, left = box
+    width = max(1, right - left)
+    margin = 0.1 * width
+    points = [p for part in landmarks.values() for p in part]
+    if not points:
+        return 0.0
+
+    inside = sum(
+        left - margin <= x <= right + margin and top - margin <= y <= bottom + margin
+        for x, y in points
+    ) / len(points)
+
+    left_eye = np.mean(landmarks.get("left_eye", [(0, 0)]), axis=0)
+    right_eye = np.mean(landmarks.get("right_eye", [(0, 0)]), axis=0)
+    nose = np.mean(landmarks.get("nose_tip", [(0, 0)]), axis=0)
+    eye_ratio = float(np.linalg.norm(left_eye - right_eye)) / width
+    lo, hi = sorted((left_eye[0], right_eye[0]))
+
+    geometry = 1.0
+    if not 0.2 <= eye_ratio <= 0.7:
+        geometry *= 0.5
+    if not lo <= nose[0] <= hi:
+        geometry *= 0.5
+    return inside * geometry
+
+
+def filter_faces(img, locations):
+    """Split detected boxes into those worth encoding and reject counts by reason."""
+    rejected = dict.fromkeys(REJECT_REASONS, 0)
+    candidates = []
+    for box in locations:
+        top, right, bottom, left = box
+        if min(bottom - top, right - left) < FACE_MIN_SIZE:
+            rejected["too_small"] += 1
+        else:
+            candidates.append(box)
+    if not candidates:
+        return [], rejected
+
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    sharp = []
+    for box in candidates:
+        if sharpness(gray, box) < FACE_MIN_SHARPNESS:
+            rejected["blurry"] += 1
+        else:
+            sharp.append(box)
+    if not sharp:
+        return [], rejected
+
+    kept = []
+    for box, landmarks in zip(sharp, face_recognition.face_landmarks(img, sharp, model="small")):
+        if landmark_score(landmarks, box) < FACE_MIN_LANDMARK_SCORE:
+            rejected["bad_landmarks"] += 1
+        else:
+            kept.append(box)
+    return kept, rejected
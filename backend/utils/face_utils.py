@@ -1,47 +1,136 @@
-import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import face_recognition
 from extensions import mongo
-from io import BytesIO
-from pymongo import MongoClient
+from utils.image_preprocess import DETECTION_PROFILES, FaceImageError, load_for_detection, scale_boxes, box_area
+from utils.face_quality import filter_faces
+from utils.face_matching import elapsed_ms
 import os
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["edu_app"]
+# Every pool process holds its own copy of the dlib models, and without a
+# face worker (FACE_WORKER_ADDRESS) each web worker runs its own pool, so
+# by default the web workers split the cores between them
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+FACE_POOL_WORKERS = int(os.getenv("FACE_POOL_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
 
-def load_known_faces_from_db():
-    encs, names = [], []
-    for face in db.known_faces.find():
-        try:
-            encoding = np.array(json.loads(face["encoding"]))
-            encs.append(encoding)
-            names.append(face["name"])
-        except Exception as e:
-            print(f"Failed to load face for {face.get('name')}: {e}")
-    return encs, names
+_face_pool = None
+
+def detect_faces(image_bytes, profile="attendance", max_side=None, upsample=None):
+    """Decode with the longest side capped by the endpoint's profile and run the detector.
+
+    ``max_side``/``upsample`` override the profile. Returns the decoded RGB
+    array, face boxes in its coordinates, the scale back to the original,
+    the original size and timings.
+    """
+    settings = DETECTION_PROFILES[profile]
+    max_side = settings["max_side"] if max_side is None else max_side
+    upsample = settings["upsample"] if upsample is None else upsample
+    timings = {}
+
+    start = time.perf_counter()
+    img, scale, original_size = load_for_detection(image_bytes, max_side)
+    timings["decode_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    face_locations = face_recognition.face_locations(img, number_of_times_to_upsample=upsample)
+    timings["detect_ms"] = elapsed_ms(start)
 
-def recognize_faces_from_bytes(image_bytes, known_encs, known_names):
+    return img, face_locations, scale, original_size, timings
+
+def detect_and_encode(image_bytes, profile="attendance", max_side=None, upsample=None):
+    """Detect, quality-gate and encode every face in an image.
+
+    Returns ((n, 128) float32 array, boxes in original-image coordinates,
+    timings, counts of faces rejected by the quality gate per reason).
+    """
+    img, face_locations, scale, original_size, timings = detect_faces(image_bytes, profile, max_side, upsample)
+
+    start = time.perf_counter()
+    face_locations, rejected = filter_faces(img, face_locations)
+    timings["quality_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
     try:
-        img = face_recognition.load_image_file(BytesIO(image_bytes))
-        face_locations = face_recognition.face_locations(img)
         face_encs = face_recognition.face_encodings(img, face_locations)
+    except RuntimeError as e:
+        raise FaceImageError(f"Could not encode faces: {e}") from e
+    timings["encode_ms"] = elapsed_ms(start)
+
+    boxes = scale_boxes(face_locations, scale, original_size)
+    return np.asarray(face_encs, dtype=np.float32).reshape(-1, 128), boxes, timings, rejected
 
-        present, unknown = set(), 0
-        for enc in face_encs:
-            if not known_encs:
-                unknown += 1
-                continue
+def encode_largest_face(image_bytes, profile):
+    """Encoding of the largest face in a single-person photo.
 
-            distances = face_recognition.face_distance(known_encs, enc)
-            best_match_index = np.argmin(distances)
+    Returns (encoding or None, {"timings", "rejected"}); a largest face that
+    fails the quality gate yields None rather than a smaller background face.
+    """
+    img, face_locations, _, _, timings = detect_faces(image_bytes, profile)
+    if not face_locations:
+        return None, {"timings": timings, "rejected": {}}
 
-            if distances[best_match_index] < 0.45:
-                present.add(known_names[best_match_index])
-            else:
-                unknown += 1
+    largest = max(face_locations, key=box_area)
+    kept, rejected = filter_faces(img, [largest])
+    if not kept:
+        return None, {"timings": timings, "rejected": rejected}
 
-        return list(present), unknown, len(face_encs)
+    start = time.perf_counter()
+    encoding = face_recognition.face_encodings(img, kept)[0]
+    timings["encode_ms"] = elapsed_ms(start)
+    return np.asarray(encoding, dtype=np.float32), {"timings": timings, "rejected": rejected}
 
-    except Exception as e:
-        print("Recognition failed:", e)
-        return [], 0, 0
\ No newline at end of file
+def warm_up():
+    """Run the detector once so a fresh process pays the dlib model load up front."""
+    face_recognition.face_locations(np.zeros((64, 64, 3), dtype=np.uint8))
+    return os.getpid()
+
+def get_face_pool(max_workers=None):
+    """Process pool for detection/encoding, FACE_POOL_WORKERS processes by default.
+
+    ``max_workers`` only applies to the call that creates the pool. Uses
+    spawn so children start from a fresh interpreter rather than a fork of
+    the parent's Mongo client and threads, and warms each child's models
+    as it starts. Spawned children do re-import the main module (main.py
+    when run directly), so it must not start background work in them.
+    """
+    global _face_pool
+    if _face_pool is None:
+        _face_pool = ProcessPoolExecutor(
+            max_workers=max_workers or FACE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up
+        )
+    return _face_pool
+
+def detect_and_encode_many(images, profile="attendance"):
+    """Run detect_and_encode over several images in parallel.
+
+    Returns one (encodings, boxes, timings, rejected, error) tuple per image, in input order.
+    """
+    futures = [get_face_pool().submit(detect_and_encode, image_bytes, profile) for image_bytes in images]
+    results = []
+    for future in futures:
+        try:
+            face_encs, boxes, timings, rejected = future.result()
+            results.append((face_encs, boxes, timings, rejected, None))
+        except Exception as e:
+            print("Recognition failed:", e)
+            results.append((np.empty((0, 128), dtype=np.float32), [], {}, {}, str(e)))
+    return results
+
+def encode_largest_face_many(images, profile="enroll"):
+    """Run encode_largest_face over several single-person photos in parallel.
+
+    Returns one (encoding or None, details, error) tuple per image, in input order.
+    """
+    futures = [get_face_pool().submit(encode_largest_face, image_bytes, profile) for image_bytes in images]
+    results = []
+    for future in futures:
+        try:
+            encoding, details = future.result()
+            results.append((encoding, details, None))
+        except Exception as e:
+            results.append((None, {"timings": {}, "rejected": {}}, str(e)))
+    return results
\ No newline at end of file
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+GRADING_CACHE_LRU_SIZE = int(os.getenv("GRADING_CACHE_LRU_SIZE", "10000"))
+GRADING_CACHE_TTL_DAYS = int(os.getenv("GRADING_CACHE_TTL_DAYS", "90"))
+# last_used_at is refreshed at most this often, so hot entries do not cost a write per hit
+TOUCH_INTERVAL = timedelta(hours=24)
+
+
+def normalize_answer(text):
+    """Case, Unicode form, whitespace and trailing punctuation do not change a grade."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(".!;,").strip()
+
+
+def grading_key(question_text, reference_text, answer_text):
+    payload = json.dumps([
+        (question_text or "").strip(),
+        normalize_answer(reference_text),
+        normalize_answer(answer_text),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GradingCache:
+    """Verdicts of past gradings keyed by question, reference and normalized answer.
+
+    An in-process LRU sits in front of a Mongo collection shared by all
+    workers. Mongo entries expire GRADING_CACHE_TTL_DAYS after they were last
+    used. Counters are per process.
+    """
+
+    def __init__(self, collection, max_entries=GRADING_CACHE_LRU_SIZE):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.stores = 0
+        try:
+            self.collection.create_index("last_used_at", expireAfterSeconds=GRADING_CACHE_TTL_DAYS * 24 * 3600)
+        except Exception as e:
+            logger.warning(f"Could not ensure TTL index on {collection.name}: {e}")
+
+    def _remember(self, key, verdict):
+        """Caller holds self._lock."""
+        self._lru[key] = verdict
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys):
+        """{key: verdict} for the keys that are cached; one Mongo query for LRU misses."""
+        found, missing = {}, []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                else:
+                    missing.append(key)
+            self.memory_hits += len(found)
+
+        if missing:
+            try:
+                docs = list(self.collection.find({"_id": {"$in": missing}}, {"verdict": 1, "last_used_at": 1}))
+            except Exception as e:
+                logger.warning(f"Grading cache lookup failed: {e}")
+                docs = []
+
+            now = datetime.utcnow()
+            stale = [doc["_id"] for doc in docs if doc.get("last_used_at", now) < now - TOUCH_INTERVAL]
+            if stale:
+                try:
+                    self.collection.update_many({"_id": {"$in": stale}}, {"$set": {"last_used_at": now}})
+                except Exception as e:
+                    logger.warning(f"Grading cache touch failed: {e}")
+
+            with self._lock:
+                for doc in docs:
+                    found[doc["_id"]] = doc["verdict"]
+                    self._remember(doc["_id"], doc["verdict"])
+                self.db_hits += len(docs)
+                self.misses += len(missing) - len(docs)
+        return found
+
+    def put_many(self, verdicts):
+        """Store {key: True/False}; anything else (failed or pending gradings) is skipped."""
+        verdicts = {key: v for key, v in verdicts.items() if v is True or v is False}
+        if not verdicts:
+            return
+        now = datetime.utcnow()
+        with self._lock:
+            for key, verdict in verdicts.items():
+                self._remember(key, verdict)
+            self.stores += len(verdicts)
+        try:
+            self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": key},
+                    {"$set": {"verdict": verdict, "last_used_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True
+                )
+                for key, verdict in verdicts.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.warning(f"Grading cache store failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            stats = {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else None,
+                "memory_entries": len(self._lru),
+                "memory_capacity": self.max_entries,
+                "ttl_days": GRADING_CACHE_TTL_DAYS,
+            }
+        try:
+            stats["db_entries"] = self.collection.estimated_document_count()
+        except Exception as e:
+            logger.warning(f"Could not count grading cache entries: {e}")
+        return stats
+
+
+grading_cache = GradingCache(db.grading_cache)
@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from utils.grading import grade_descriptive_answers, PENDING
+
+logger = logging.getLogger(__name__)
+
+GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "50"))
+GRADING_SWEEP_SECONDS = float(os.getenv("GRADING_SWEEP_SECONDS", "60"))
+# A claim older than this is assumed to belong to a worker that died mid-grading
+GRADING_LEASE_SECONDS = float(os.getenv("GRADING_LEASE_SECONDS", "600"))
+GRADING_BACKGROUND_DEADLINE = float(os.getenv("GRADING_BACKGROUND_DEADLINE", "120"))
+GRADING_MAX_ATTEMPTS = int(os.getenv("GRADING_MAX_ATTEMPTS", "3"))
+
+GRADING = "grading"
+GRADED = "graded"
+# Per answer: gave up after GRADING_MAX_ATTEMPTS. Per submission: graded
+# apart from such answers, so the score is not final.
+FAILED = "failed"
+
+# submissions: collection; parent_field: "quiz_id"/"assignment_id";
+# parents: collections the quiz/assignment may live in, searched in order
+GradingSource = namedtuple("GradingSource", "submissions parent_field parents")
+
+
+def pending_answers(answers, status=PENDING):
+    return [q for q, a in answers.items() if isinstance(a, dict) and a.get("grading") == status]
+
+
+def failed_answers(answers):
+    return pending_answers(answers, FAILED)
+
+
+class GradingQueue:
+    """Background grader for descriptive answers of stored submissions.
+
+    The submission documents are the queue: anything with grading_status
+    "pending" gets graded, whichever worker picks it up first. enqueue() only
+    wakes the local dispatcher early. Submissions are claimed atomically so
+    two workers never grade the same one, grouped by quiz/assignment so the
+    questions are loaded once per group, and a periodic sweep resumes work
+    left behind by restarts or crashed workers.
+    """
+
+    def __init__(self, sources, batch_size=GRADING_BATCH_SIZE, sweep_seconds=GRADING_SWEEP_SECONDS):
+        self.sources = sources
+        self.batch_size = batch_size
+        self.sweep_seconds = sweep_seconds
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        # Also restarts the dispatcher in a forked worker, where the thread does not survive
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="grading-dispatcher", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, kind, submission_id):
+        self.start()
+        self._queue.put((kind, ObjectId(submission_id)))
+
+    def _run(self):
+        next_sweep = 0.0  # sweep right away, which resumes anything left pending
+        while True:
+            try:
+                items = [self._queue.get(timeout=max(0.0, next_sweep - time.monotonic()))]
+            except queue.Empty:
+                items = []
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                if time.monotonic() >= next_sweep:
+                    items += self._sweep()
+                    next_sweep = time.monotonic() + self.sweep_seconds
+                if items:
+                    self._process(items)
+            except Exception as e:
+                logger.error(f"❌ Grading dispatcher error: {e}", exc_info=True)
+
+    def _claimable(self):
+        stale = datetime.utcnow() - timedelta(seconds=GRADING_LEASE_SECONDS)
+        return {"$or": [
+            {"grading_status": PENDING},
+            {"grading_status": GRADING, "grading_claimed_at": {"$lt": stale}},
+        ]}
+
+    def _sweep(self):
+        items = []
+        for kind, source in self.sources.items():
+            for doc in source.submissions.find(self._claimable(), {"_id": 1}).limit(self.batch_size):
+                items.append((kind, doc["_id"]))
+        return items
+
+    def _claim(self, kind, submission_id):
+        query = self._claimable()
+        query["_id"] = submission_id
+        return self.sources[kind].submissions.find_one_and_update(
+            query,
+            {"$set": {"grading_status": GRADING, "grading_claimed_at": datetime.utcnow()},
+             "$inc": {"grading_attempts": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _load_questions(self, source, parent_id):
+        try:
+            parent_oid = ObjectId(parent_id)
+        except Exception:
+            return []
+        for collection in source.parents:
+            parent = collection.find_one({"_id": parent_oid}, {"questions": 1})
+            if parent:
+                return parent.get("questions", [])
+        return []
+
+    def _process(self, items):
+        groups = {}
+        for kind, submission_id in dict.fromkeys(items):  # duplicates from enqueue + sweep
+            doc = self._claim(kind, submission_id)
+            if doc:
+                source = self.sources[kind]
+                groups.setdefault((kind, doc.get(source.parent_field)), []).append(doc)
+
+        for (kind, parent_id), docs in groups.items():
+            source = self.sources[kind]
+            questions = self._load_questions(source, parent_id)
+            self._grade_group(source, questions, docs)
+
+    def _grade_group(self, source, questions, docs):
+        references = {q["question"]: q.get("answer", "").strip().lower() for q in questions}
+        items, owners = [], []
+        for doc in docs:
+            for question_text in pending_answers(doc.get("answers", {})):
+                answer = doc["answers"][question_text]
+                items.append((question_text, (answer.get("text") or "").strip(), references.get(question_text, "")))
+                owners.append((doc["_id"], question_text))
+
+        # Every pending answer of the group goes through one concurrent grading call
+        verdicts = dict(zip(owners, grade_descriptive_answers(items, deadline=GRADING_BACKGROUND_DEADLINE)))
+        for doc in docs:
+            self._finish(source, doc, verdicts)
+
+    def _finish(self, source, doc, verdicts):
+        answers = doc.get("answers", {})
+        out_of_attempts = doc.get("grading_attempts", 1) >= GRADING_MAX_ATTEMPTS
+        gained, left, failed = 0, 0, 0
+        for question_text in pending_answers(answers):
+            verdict = verdicts.get((doc["_id"], question_text), PENDING)
+            answer = answers[question_text]
+            if verdict is True or verdict is False:
+                answer["is_correct"] = verdict
+                answer.pop("grading", None)
+                gained += verdict
+            elif out_of_attempts:
+                answer["grading"] = FAILED
+                failed += 1
+            else:
+                left += 1
+
+        score = doc.get("score", 0) + gained
+        total = doc.get("total_questions", 0)
+        status = PENDING if left else FAILED if failed else GRADED
+        fields = {
+            "answers": answers,
+            "score": score,
+            "percentage": round((score / total) * 100, 2) if total else 0,
+            "grading_status": status,
+        }
+        if status == GRADED:
+            fields["graded_at"] = datetime.utcnow()
+
+        # Only write if our claim still stands
+        result = source.submissions.update_one(
+            {"_id": doc["_id"], "grading_status": GRADING, "grading_claimed_at": doc["grading_claimed_at"]},
+            {"$set": fields}
+        )
+        if result.matched_count:
+            logger.info(f"📝 Graded submission {doc['_id']}: +{gained}, {left} still pending, {failed} failed")
@@ -0,0 +1,80 @@
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# File types accepted from photo archives and directories
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Detection resolution per endpoint. Group photos need more pixels per face
+# than the single-face portraits used for enrolment, registration and login.
+_PROFILE_DEFAULTS = {
+    "attendance": (1600, 1),
+    "enroll": (800, 1),
+    "register": (800, 1),
+    "login": (640, 1),
+}
+
+
+def _profile(name, max_side, upsample):
+    key = name.upper()
+    return {
+        "max_side": int(os.getenv(f"FACE_MAX_SIDE_{key}", str(max_side))),
+        "upsample": int(os.getenv(f"FACE_UPSAMPLE_{key}", str(upsample))),
+    }
+
+
+DETECTION_PROFILES = {name: _profile(name, *defaults) for name, defaults in _PROFILE_DEFAULTS.items()}
+
+
+class FaceImageError(ValueError):
+    """An image that could not be decoded or encoded; only that image is lost."""
+
+
+def load_for_detection(image_bytes, max_side):
+    """Decode an image with its longest side capped at ``max_side``.
+
+    JPEGs are decoded directly at a reduced DCT scale (1/2, 1/4, 1/8) when
+    possible, so a 12 MP phone photo is never fully decompressed. Returns the
+    RGB array, the factor that maps its coordinates back to the original,
+    and the original (width, height).
+    """
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        width, height = img.size
+        longest = max(width, height)
+
+        if max_side and longest > max_side:
+            ratio = max_side / longest
+            target = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+            img.draft("RGB", target)
+            img = img.convert("RGB")
+            if img.size != target:
+                img = img.resize(target, Image.BILINEAR)
+        else:
+            img = img.convert("RGB")
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+        raise FaceImageError(f"Could not decode image: {e}") from e
+
+    scale = longest / max(img.size)
+    return np.asarray(img), scale, (width, height)
+
+
+def scale_boxes(locations, scale, original_size):
+    """Map (top, right, bottom, left) boxes from the decoded image to the original."""
+    width, height = original_size
+    boxes = []
+    for top, right, bottom, left in locations:
+        boxes.append((
+            max(0, int(round(top * scale))),
+            min(width, int(round(right * scale))),
+            min(height, int(round(bottom * scale))),
+            max(0, int(round(left * scale))),
+        ))
+    return boxes
+
+
+def box_area(box):
+    top, right, bottom, left = box
+    return max(0, bottom - top) * max(0, right - left)
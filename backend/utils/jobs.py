@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+client = MongoClient(os.getenv("MONGO_URI"))
+db = client["edu_app"]
+
+ATTENDANCE_JOB_WORKERS = int(os.getenv("ATTENDANCE_JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# A queued/running job nobody has heartbeated for this long belonged to a
+# worker that restarted or died; its inputs were only in that worker's memory
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+ACTIVE_STATUSES = ["queued", "running"]
+LOST_JOB_ERROR = "The server restarted before this job finished; please submit it again."
+
+
+class JobRunner:
+    """Runs work on a local thread pool and records its state in Mongo.
+
+    Job documents live in Mongo rather than in memory so that any web worker
+    can answer a status poll, not only the one that accepted the job. The
+    work itself only lives in this process, so a heartbeat thread keeps
+    heartbeat_at fresh on the jobs it holds and fails queued/running jobs
+    whose heartbeat is older than JOB_LEASE_SECONDS, which is what is left
+    behind when a worker restarts mid-job.
+    """
+
+    def __init__(self, collection, max_workers):
+        self.collection = collection
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=collection.name)
+        self._live = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=JOB_TTL_SECONDS)
+            self.collection.create_index([("status", 1), ("heartbeat_at", 1)])
+        except Exception as e:
+            print(f"Could not ensure indexes on {collection.name}: {e}")
+
+    def start(self):
+        # Also restarts the heartbeat in a forked worker, where the thread does not survive
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._heartbeat, name=f"{self.collection.name}-heartbeat", daemon=True)
+            self._thread.start()
+
+    def _heartbeat(self):
+        while True:
+            try:
+                self._beat()
+            except Exception as e:
+                print(f"Job heartbeat failed for {self.collection.name}: {e}")
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+
+    def _beat(self):
+        now = datetime.utcnow()
+        with self._lock:
+            live = list(self._live)
+        if live:
+            self.collection.update_many({"_id": {"$in": live}}, {"$set": {"heartbeat_at": now}})
+
+        stale = now - timedelta(seconds=JOB_LEASE_SECONDS)
+        result = self.collection.update_many(
+            {"status": {"$in": ACTIVE_STATUSES}, "$or": [
+                {"heartbeat_at": {"$lt": stale}},
+                {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": stale}},
+            ]},
+            {"$set": {"status": "failed", "stage": "failed", "error": LOST_JOB_ERROR, "finished_at": now}}
+        )
+        if result.modified_count:
+            print(f"Failed {result.modified_count} lost jobs in {self.collection.name}")
+
+    def submit(self, kind, fn, *args, owner=None, **kwargs):
+        """Queue ``fn(report, *args, **kwargs)`` and return the job id.
+
+        ``report(stage, progress)`` lets the job publish where it is.
+        """
+        self.start()
+        job_id = ObjectId()
+        now = datetime.utcnow()
+        self.collection.insert_one({
+            "_id": job_id,
+            "kind": kind,
+            "owner": owner,
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0,
+            "created_at": now,
+            "heartbeat_at": now,
+        })
+        with self._lock:
+            self._live.add(job_id)
+        self.executor.submit(self._run, job_id, fn, args, kwargs)
+        return str(job_id)
+
+    def _update(self, job_id, fields):
+        try:
+            self.collection.update_one({"_id": job_id}, {"$set": fields})
+        except Exception as e:
+            print(f"Failed to update job {job_id}: {e}")
+
+    def _run(self, job_id, fn, args, kwargs):
+        def report(stage, progress):
+            self._update(job_id, {"stage": stage, "progress": progress})
+
+        self._update(job_id, {"status": "running", "started_at": datetime.utcnow()})
+        try:
+            result = fn(report, *args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, {
+                "status": "failed",
+                "stage": "failed",
+                "error": str(e),
+                "finished_at": datetime.utcnow(),
+            })
+            return
+        finally:
+            with self._lock:
+                self._live.discard(job_id)
+
+        self._update(job_id, {
+            "status": "done",
+            "stage": "done",
+            "progress": 100,
+            "result": result,
+            "finished_at": datetime.utcnow(),
+        })
+
+    def get(self, job_id):
+        try:
+            job = self.collection.find_one({"_id": ObjectId(job_id)})
+        except Exception:
+            return None
+        if not job:
+            return None
+
+        job["_id"] = str(job["_id"])
+        for key in ("created_at", "started_at", "finished_at", "heartbeat_at"):
+            if isinstance(job.get(key), datetime):
+                job[key] = job[key].isoformat()
+        return job
+
+
+# Started by main.py in the server process (and by submit()), never on import
+attendance_jobs = JobRunner(db.attendance_jobs, ATTENDANCE_JOB_WORKERS)
@@ -0,0 +1,115 @@
+import logging
+import os
+import random
+import threading
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from utils.grading_cache import normalize_answer
+
+logger = logging.getLogger(__name__)
+
+# An answer identical to the reference after normalize_answer is graded
+# correct locally; everything else goes to the LLM. TF-IDF similarity only
+# counts shared words, so it fails correct paraphrases ("last in first out"
+# for "lifo") and passes negations: its bands are off by default and should
+# only be widened once the audit agreement for them is known
+LOCAL_GRADE_PASS_AT = float(os.getenv("LOCAL_GRADE_PASS_AT", "inf"))
+LOCAL_GRADE_FAIL_BELOW = float(os.getenv("LOCAL_GRADE_FAIL_BELOW", "0"))
+# Shorter answers always go to the LLM
+LOCAL_GRADE_MIN_WORDS = int(os.getenv("LOCAL_GRADE_MIN_WORDS", "3"))
+# Share of locally decided answers also sent to the LLM to measure agreement
+LOCAL_GRADE_AUDIT_RATE = float(os.getenv("LOCAL_GRADE_AUDIT_RATE", "0.05"))
+LOCAL_GRADE_ENABLED = os.getenv("LOCAL_GRADE_ENABLED", "1") not in ("0", "false", "no")
+
+
+def answer_similarity(reference_text, answer_text):
+    """TF-IDF cosine similarity between a reference and a student answer, 0..1."""
+    try:
+        vectorizer = TfidfVectorizer().fit([reference_text, answer_text])
+    except ValueError:
+        return 0.0  # nothing but stop characters in either text
+    vecs = vectorizer.transform([reference_text, answer_text])
+    return float(cosine_similarity(vecs[0:1], vecs[1:2])[0][0])
+
+
+def local_verdict(reference_text, answer_text):
+    """(verdict, similarity): True/False when decisive, None when the LLM should decide."""
+    answer = normalize_answer(answer_text)
+    if len(answer.split()) < LOCAL_GRADE_MIN_WORDS:
+        return None, None
+    if answer == normalize_answer(reference_text):
+        return True, 1.0
+    if LOCAL_GRADE_PASS_AT == float("inf") and LOCAL_GRADE_FAIL_BELOW <= 0:
+        return None, None  # no similarity bands configured; skip the TF-IDF fit
+
+    similarity = answer_similarity(reference_text, answer_text)
+    if similarity >= LOCAL_GRADE_PASS_AT:
+        return True, similarity
+    if similarity < LOCAL_GRADE_FAIL_BELOW:
+        return False, similarity
+    return None, similarity
+
+
+class TieredGradingMetrics:
+    """Per-process counters for the local first pass and its audit against the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local_pass = 0
+        self.local_fail = 0
+        self.escalated = 0
+        self.audited = 0
+        self.audit_agree = 0
+        self.audit_disagree = 0
+
+    def should_audit(self):
+        return random.random() < LOCAL_GRADE_AUDIT_RATE
+
+    def record_local(self, verdict):
+        with self._lock:
+            if verdict:
+                self.local_pass += 1
+            else:
+                self.local_fail += 1
+
+    def record_escalated(self, count=1):
+        with self._lock:
+            self.escalated += count
+
+    def record_audit(self, local, llm, similarity, question_text):
+        if llm is not True and llm is not False:
+            return
+        with self._lock:
+            self.audited += 1
+            if local == llm:
+                self.audit_agree += 1
+            else:
+                self.audit_disagree += 1
+        if local != llm:
+            logger.info(f"🔍 Local grade {local} disagreed with LLM {llm} at similarity {similarity:.2f} "
+                        f"for question '{question_text}'")
+
+    def stats(self):
+        with self._lock:
+            local = self.local_pass + self.local_fail
+            total = local + self.escalated
+            return {
+                "enabled": LOCAL_GRADE_ENABLED,
+                "pass_at": LOCAL_GRADE_PASS_AT if LOCAL_GRADE_PASS_AT != float("inf") else None,
+                "fail_below": LOCAL_GRADE_FAIL_BELOW,
+                "min_words": LOCAL_GRADE_MIN_WORDS,
+                "audit_rate": LOCAL_GRADE_AUDIT_RATE,
+                "local_pass": self.local_pass,
+                "local_fail": self.local_fail,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / total, 4) if total else None,
+                "audited": self.audited,
+                "audit_agree": self.audit_agree,
+                "audit_disagree": self.audit_disagree,
+                "audit_agreement": round(self.audit_agree / self.audited, 4) if self.audited else None,
+            }
+
+
+tiered_metrics = TieredGradingMetrics()
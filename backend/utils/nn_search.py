@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+
+
+def _sq_norms(matrix):
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+def _sq_distances(query, matrix, matrix_sq_norms):
+    sq = matrix_sq_norms - 2.0 * (matrix @ query) + float(query @ query)
+    return np.maximum(sq, 0.0)
+
+
+def _top_k(sq_distances, k):
+    k = min(k, sq_distances.shape[0])
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(sq_distances, k - 1)[:k]
+    return idx[np.argsort(sq_distances[idx])]
+
+
+class FlatSearch:
+    """Exact nearest-neighbour search over every row of the matrix."""
+
+    kind = "flat"
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+        self.sq_norms = _sq_norms(self.matrix)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        self.matrix = np.vstack([self.matrix, vectors])
+        self.sq_norms = np.concatenate([self.sq_norms, _sq_norms(vectors)])
+
+    def search(self, query, k=1):
+        query = np.asarray(query, dtype=np.float32)
+        sq = _sq_distances(query, self.matrix, self.sq_norms)
+        idx = _top_k(sq, k)
+        return idx, np.sqrt(sq[idx])
+
+    exact_search = search
+
+
+class IVFSearch(FlatSearch):
+    """Inverted-file index: k-means coarse quantiser plus exact re-ranking.
+
+    A query is compared against the list centroids first and only the rows in
+    the closest lists are scanned. At least ``n_probe`` lists are probed, and
+    at least ``probe_fraction`` of them, so recall does not drop as the
+    number of lists grows with ``sqrt(N)``. ``exact_search`` scans every row.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, matrix, n_lists=None, n_probe=8, probe_fraction=0.1, iterations=10, seed=0):
+        super().__init__(matrix)
+        n = self.matrix.shape[0]
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        self.n_probe = max(1, min(max(n_probe, math.ceil(probe_fraction * self.n_lists)), self.n_lists))
+        self.centroids = self._train(iterations, seed)
+        self.lists = self._build_lists(self._assign(self.matrix))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def _assign(self, vectors, chunk=4096):
+        centroid_sq = _sq_norms(self.centroids)
+        labels = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk):
+            block = vectors[start:start + chunk]
+            sq = centroid_sq[None, :] - 2.0 * (block @ self.centroids.T)
+            labels[start:start + chunk] = np.argmin(sq, axis=1)
+        return labels
+
+    def _train(self, iterations, seed):
+        rng = np.random.default_rng(seed)
+        pick = rng.choice(self.matrix.shape[0], self.n_lists, replace=False)
+        self.centroids = self.matrix[pick].copy()
+        for _ in range(iterations):
+            labels = self._assign(self.matrix)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, self.matrix)
+            counts = np.bincount(labels, minlength=self.n_lists)
+            filled = counts > 0
+            self.centroids[filled] = sums[filled] / counts[filled, None]
+        return self.centroids
+
+    def _build_lists(self, labels):
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(self.n_lists + 1))
+        return [order[bounds[i]:bounds[i + 1]] for i in range(self.n_lists)]
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        first = self.matrix.shape[0]
+        self.matrix = np.vstack([self.matrix, vectors])
+        self.sq_norms = np.concatenate([self.sq_norms, _sq_norms(vectors)])
+        for offset, label in enumerate(self._assign(vectors)):
+            self.lists[label] = np.append(self.lists[label], first + offset)
+
+    def search(self, query, k=1):
+        query = np.asarray(query, dtype=np.float32)
+        centroid_sq = _sq_norms(self.centroids) - 2.0 * (self.centroids @ query)
+        probe = _top_k(centroid_sq, self.n_probe)
+        candidates = np.concatenate([self.lists[i] for i in probe])
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        sq = _sq_distances(query, self.matrix[candidates], self.sq_norms[candidates])
+        best = _top_k(sq, k)
+        return candidates[best], np.sqrt(sq[best])
+
+
+def build_search(matrix, ann_min_size, n_probe=8, probe_fraction=0.1):
+    """Flat search for small galleries, IVF once the gallery reaches ``ann_min_size`` rows."""
+    if ann_min_size and len(matrix) >= ann_min_size:
+        return IVFSearch(matrix, n_probe=n_probe, probe_fraction=probe_fraction)
+    return FlatSearch(matrix)
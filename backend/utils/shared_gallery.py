@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines; publishing is then only safe within one process
+    fcntl = None
+
+# Galleries live in a subdirectory per data source (see store_namespace)
+FACE_GALLERY_DIR = os.getenv("FACE_GALLERY_DIR") or os.path.join(tempfile.gettempdir(), "edu_app_face_gallery")
+FACE_GALLERY_SHARED = os.getenv("FACE_GALLERY_SHARED", "1") not in ("0", "false", "no")
+# Generations kept on disk besides the current one, for readers still switching over
+KEEP_GENERATIONS = 2
+
+ARRAYS = ("encodings", "prototypes", "proto_offsets")
+
+
+class SharedGalleryStore:
+    """Gallery published as memory-mapped .npy files shared by every worker.
+
+    Each publish writes a complete ``gen-<n>`` directory and then atomically
+    swaps the ``CURRENT`` pointer file, so readers never see a half-written
+    gallery. Readers map the arrays read-only; the page cache holds a single
+    copy no matter how many processes map it. Checking for a new generation
+    is one ``stat`` of the pointer file.
+
+    Each generation also records the ``source`` it was built from (e.g. a
+    count of the collection), so a process starting up can tell whether
+    what is on disk still matches the database.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._pointer = os.path.join(directory, "CURRENT")
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock held by whoever builds and publishes a generation."""
+        with open(os.path.join(self.directory, "LOCK"), "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def stamp(self):
+        """Cheap token that changes whenever a new generation is published."""
+        try:
+            st = os.stat(self._pointer)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def generation(self):
+        try:
+            with open(self._pointer) as fh:
+                return int(fh.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def publish(self, names, arrays, source=None):
+        """Write a new generation and make it current. Call while holding lock()."""
+        generation = (self.generation() or 0) + 1
+        final = os.path.join(self.directory, f"gen-{generation}")
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+        try:
+            for key in ARRAYS:
+                np.save(os.path.join(staging, f"{key}.npy"), np.ascontiguousarray(arrays[key]))
+            with open(os.path.join(staging, "names.json"), "w") as fh:
+                json.dump(names, fh)
+            with open(os.path.join(staging, "source.json"), "w") as fh:
+                json.dump(source, fh)
+            os.replace(staging, final)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        tmp_pointer = f"{self._pointer}.{os.getpid()}"
+        with open(tmp_pointer, "w") as fh:
+            fh.write(str(generation))
+        os.replace(tmp_pointer, self._pointer)
+
+        self._prune(generation)
+        return generation
+
+    def load(self):
+        """Map the current generation read-only: (generation, names, arrays) or None."""
+        generation = self.generation()
+        if generation is None:
+            return None
+        path = os.path.join(self.directory, f"gen-{generation}")
+        try:
+            arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in ARRAYS}
+            with open(os.path.join(path, "names.json")) as fh:
+                names = json.load(fh)
+        except FileNotFoundError:
+            # Pruned between reading the pointer and opening the files; caller retries
+            return None
+        return generation, names, arrays
+
+    def source(self):
+        """The ``source`` the current generation was published with, or None."""
+        generation = self.generation()
+        if generation is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, f"gen-{generation}", "source.json")) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _prune(self, current):
+        for entry in os.listdir(self.directory):
+            if not entry.startswith("gen-"):
+                continue
+            try:
+                generation = int(entry[4:])
+            except ValueError:
+                continue
+            # Mapped files stay valid after unlinking, so old readers are unaffected
+            if generation < current - KEEP_GENERATIONS:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+
+def store_namespace(*parts):
+    """Directory name for one data source, so deployments sharing a host never share a gallery."""
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+
+def default_store(namespace):
+    if not FACE_GALLERY_SHARED:
+        return None
+    directory = os.path.join(FACE_GALLERY_DIR, namespace)
+    try:
+        return SharedGalleryStore(directory)
+    except OSError as e:
+        print(f"Shared face gallery disabled, cannot use {directory}: {e}")
+        return None
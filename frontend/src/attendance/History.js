@@ -87,6 +87,27 @@ const LoadingSpinner = styled.div`
   margin: 2rem auto;
 `;
 
+const LoadMoreButton = styled.button`
+  display: block;
+  margin: 1.5rem auto 0;
+  padding: 0.6rem 1.5rem;
+  background-color: #4299e1;
+  color: white;
+  border: none;
+  border-radius: 0.375rem;
+  font-weight: 600;
+  cursor: pointer;
+
+  &:hover {
+    background-color: #3182ce;
+  }
+
+  &:disabled {
+    background-color: #a0aec0;
+    cursor: not-allowed;
+  }
+`;
+
 const LoadingRow = styled(TableRow)`
   td {
     text-align: center;
@@ -97,12 +118,21 @@ const LoadingRow = styled(TableRow)`
 export default function History() {
   const [records, setRecords] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // History is paginated newest first; each page returns the cursor for the next one
+  const fetchPage = (cursor) =>
+    axios.get(`${BASE_URL}api/attendance_history`, {
+      params: cursor ? { cursor } : {},
+    });
 
   useEffect(() => {
     setIsLoading(true);
-    axios.get(`${BASE_URL}api/attendance_history`)
+    fetchPage(null)
       .then((res) => {
-        setRecords(res.data);
+        setRecords(res.data.items);
+        setNextCursor(res.data.next_cursor);
       })
       .catch((err) => {
         console.error("Failed to load history", err);
@@ -112,6 +142,21 @@ export default function History() {
       });
   }, []);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPage(nextCursor)
+      .then((res) => {
+        setRecords((prev) => [...prev, ...res.data.items]);
+        setNextCursor(res.data.next_cursor);
+      })
+      .catch((err) => {
+        console.error("Failed to load more history", err);
+      })
+      .finally(() => {
+        setLoadingMore(false);
+      });
+  };
+
   return (
     <Container>
       <Card
@@ -145,6 +190,12 @@ export default function History() {
             </tbody>
           </Table>
         )}
+
+        {!isLoading && nextCursor && (
+          <LoadMoreButton onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : "Load more"}
+          </LoadMoreButton>
+        )}
       </Card>
     </Container>
   );
@@ -162,10 +162,31 @@ const NoKnownText = styled.p`
   margin: 1rem 0;
 `;
 
+const POLL_INTERVAL_MS = 1000;
+// Longer than the server's job lease, so a job lost to a restart shows up as failed first
+const POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// The upload endpoint queues a job; poll it until recognition finishes.
+const waitForJob = async (jobId, onProgress) => {
+  const deadline = Date.now() + POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const res = await axios.get(`${BASE_URL}api/attendance_jobs/${jobId}`);
+    const job = res.data;
+    if (job.status === "done") return job.result;
+    if (job.status === "failed") throw new Error(job.error || "Processing failed");
+    onProgress(job);
+    await sleep(POLL_INTERVAL_MS);
+  }
+  throw new Error("Processing is taking too long. Check the attendance records later.");
+};
+
 export default function UploadPage() {
   const [image, setImage] = useState(null);
   const [result, setResult] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [stage, setStage] = useState(null);
 
   const submit = async () => {
     if (!image) {
@@ -178,17 +199,20 @@ export default function UploadPage() {
 
     setLoading(true);
     setResult(null); 
+    setStage(null);
 
     try {
       const res = await axios.post(`${BASE_URL}api/attendance_upload`, fd, {
         headers: { "Content-Type": "multipart/form-data" },
       });
-      setResult(res.data);
+      const jobResult = await waitForJob(res.data.job_id, (job) => setStage(job.stage));
+      setResult(jobResult);
     } catch (err) {
       console.error(err);
-      alert("Upload failed.");
+      alert(err.isAxiosError ? "Upload failed." : err.message);
     } finally {
       setLoading(false);
+      setStage(null);
     }
   };
 
@@ -224,7 +248,11 @@ export default function UploadPage() {
         </UploadButton>
 
         {loading && (
-          <LoadingText>Detecting faces, please wait...</LoadingText>
+          <LoadingText>
+            {stage === "recording" || stage === "saving_photo"
+              ? "Recording attendance..."
+              : "Detecting faces, please wait..."}
+          </LoadingText>
         )}
 
         {result && !loading && (
@@ -322,6 +322,14 @@ const shuffleArray = (array) => {
   return newArray;
 };
 
+// Descriptive answers may still be grading in the background, in which
+// case the score only covers the answers graded so far
+const scoreSummary = (result) => {
+  const score = `${result.score}/${result.total_questions}`;
+  if (!result.pending_answers) return `Your score: ${score}`;
+  return `Score so far: ${score}. ${result.pending_answers} descriptive answer(s) are still being graded; check your results later for the final score.`;
+};
+
 function TakeAssignment() {
   const [assignments, setAssignments] = useState([]);
   const [selectedAssignment, setSelectedAssignment] = useState(null);
@@ -481,7 +489,7 @@ const handleAutoSubmit = useCallback(() => {
   axios.post(`${BASE_URL}submit-assignment`, payload)
     .then(res => {
       setSubmissionResult(res.data.result);
-      alert(`⏰ Time's up! Auto-submitted. Score: ${res.data.result.score}`);
+      alert(`⏰ Time's up! Auto-submitted. ${scoreSummary(res.data.result)}`);
       fetchExplanations(payload, selectedAssignment);
       setShowResults(true);
       setHasViewedResults(false);
@@ -734,9 +742,7 @@ const fetchExplanations = async (submissionData, assignmentData) => {
     axios.post(`${BASE_URL}submit-assignment`, payload)
       .then(res => {
         setSubmissionResult(res.data.result);
-        const message = selectedAssignment.questions.some(q => !q.options) ?
-          "✅ Submitted! Your multiple-choice answers have been graded. Descriptive answers will be AI." :
-          `✅ Submitted! Your score: ${res.data.result.score}/${res.data.result.total_questions}`;
+        const message = `✅ Submitted! ${scoreSummary(res.data.result)}`;
         
         alert(message);
 
@@ -818,7 +824,7 @@ const fetchExplanations = async (submissionData, assignmentData) => {
           {submissionResult && (
             <div style={{ marginBottom: '1.5rem', padding: '1rem', background: '#f0f9ff', borderRadius: '8px' }}>
               <h3>Score Summary</h3>
-              <p>You scored {submissionResult.score} out of {submissionResult.total_questions}</p>
+              <p>{scoreSummary(submissionResult)}</p>
             </div>
           )}
           
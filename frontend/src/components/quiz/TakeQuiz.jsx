@@ -455,6 +455,14 @@ const shuffleArray = (array) => {
   return newArray;
 };
 
+// Descriptive answers may still be grading in the background, in which
+// case the score only covers the answers graded so far
+const scoreSummary = (result) => {
+  const score = `${result.score}/${result.total_questions}`;
+  if (!result.pending_answers) return `Your score: ${score}`;
+  return `Score so far: ${score}. ${result.pending_answers} descriptive answer(s) are still being graded; check your results later for the final score.`;
+};
+
 function TakeQuiz() {
   const [quizzes, setQuizzes] = useState([]);
   const [selectedQuiz, setSelectedQuiz] = useState(null);
@@ -516,7 +524,7 @@ const handleAutoSubmit = useCallback(() => {
 
   axios.post(`${BASE_URL}submit`, payload)
     .then(res => {
-      alert(`⏰ Time's up! Auto-submitted. Score: ${res.data.result.score}`);
+      alert(`⏰ Time's up! Auto-submitted. ${scoreSummary(res.data.result)}`);
       handleQuizCompletion(selectedQuiz._id);
     })
     .catch(err => {
@@ -777,9 +785,7 @@ const handleSubmit = () => {
 
   axios.post(`${BASE_URL}submit`, payload)
     .then(res => {
-      const message = selectedQuiz.questions.some(q => !q.options) ?
-        "✅ Submitted! Your multiple-choice answers have been graded. Descriptive answers will be reviewed AI." :
-        `✅ Submitted! Your score: ${res.data.result.score}/${res.data.result.total_questions}`;
+      const message = `✅ Submitted! ${scoreSummary(res.data.result)}`;
       
       alert(message);
       handleQuizCompletion(selectedQuiz._id);